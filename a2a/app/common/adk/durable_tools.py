@@ -0,0 +1,142 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Optional, TypeVar, overload
+
+from google.adk.tools import BaseTool
+from pydantic import BaseModel
+
+from app.common.adk import metrics
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_OPTIONS_ATTRIBUTE = "_restate_durable_tool"
+
+tool_cache_lookups = metrics.meter.create_counter(
+    "restate_adk.tool_cache.lookups",
+    description="Lookups in the memo cache of pure durable tools, by result (hit/miss).",
+)
+
+
+@dataclass(frozen=True)
+class DurableToolOptions:
+    """How the RestatePlugin executes a durable tool.
+
+    Attributes:
+        max_attempts: Maximum number of attempts of the journaled step. None retries forever.
+        pure: The result only depends on the arguments, so it can be memoized across invocations.
+        ttl: How long a memoized result stays valid. None keeps it until evicted.
+    """
+
+    max_attempts: Optional[int] = None
+    pure: bool = False
+    ttl: Optional[timedelta] = None
+
+
+@overload
+def durable_tool(func: F) -> F: ...
+
+
+@overload
+def durable_tool(
+    *, max_attempts: Optional[int] = None, pure: bool = False, ttl: Optional[timedelta] = None
+) -> Callable[[F], F]: ...
+
+
+def durable_tool(
+    func: Optional[F] = None,
+    *,
+    max_attempts: Optional[int] = None,
+    pure: bool = False,
+    ttl: Optional[timedelta] = None,
+):
+    """Mark a tool function to be executed by the RestatePlugin as a single journaled step.
+
+    The tool does not need the Restate context: the plugin runs the whole tool inside
+    ctx.run_typed. Because of that, the tool must not use the Restate context itself.
+
+    Tools marked as pure are additionally memoized across invocations (see ToolResultCache),
+    keyed on the tool name and the arguments.
+
+    Example:
+        @durable_tool(pure=True, ttl=timedelta(minutes=10))
+        async def get_weather(city: str) -> WeatherResponse:
+            ...
+    """
+    options = DurableToolOptions(max_attempts=max_attempts, pure=pure, ttl=ttl)
+
+    def mark(f: F) -> F:
+        setattr(f, _OPTIONS_ATTRIBUTE, options)
+        return f
+
+    if func is not None:
+        return mark(func)
+    return mark
+
+
+def durable_tool_options(tool: BaseTool) -> Optional[DurableToolOptions]:
+    """Get the options of a tool marked with @durable_tool, or None if it isn't marked."""
+    return getattr(getattr(tool, "func", None), _OPTIONS_ATTRIBUTE, None)
+
+
+def tool_result_to_dict(result: Any) -> dict:
+    """Turn a tool result into the JSON dict that ADK puts in the function response."""
+    if isinstance(result, BaseModel):
+        result = result.model_dump(mode="json")
+    if not isinstance(result, dict):
+        # Same wrapping as ADK does for non-dict tool results
+        result = {"result": result}
+    return result
+
+
+class ToolResultCache:
+    """Process-wide LRU cache with TTL for the results of pure durable tools.
+
+    Lookups happen inside the journaled tool step, so a hit only skips the external call;
+    the result is journaled as usual and replays never consult the cache.
+    """
+
+    def __init__(self, *, max_entries: int = 1024):
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[Optional[float], dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(tool_name: str, args: dict[str, Any]) -> str:
+        """Canonical key of a tool call: the tool name and the args as sorted, compact JSON."""
+        return tool_name + ":" + json.dumps(args, sort_keys=True, separators=(",", ":"), default=str)
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                tool_cache_lookups.add(1, {"result": "miss"})
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        tool_cache_lookups.add(1, {"result": "hit"})
+        return dict(entry[1])
+
+    def put(self, key: str, result: dict, ttl: Optional[timedelta] = None) -> None:
+        expires_at = time.monotonic() + ttl.total_seconds() if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expires_at, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
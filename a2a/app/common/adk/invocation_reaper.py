@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from typing import Callable
+
+from restate.context import AttemptFinishedEvent
+
+logger = logging.getLogger(__name__)
+
+
+class InvocationReaper:
+    """Releases the resources of invocations whose attempt finished early.
+
+    Normally the plugin releases the resources of an invocation in after_agent_callback.
+    If the attempt ends before that (suspension, transient error, lost connection),
+    the callback never runs. Instead of parking one task per invocation to wait for
+    that, a single background task periodically sweeps all tracked invocations and
+    releases the finished ones in bulk.
+    """
+
+    def __init__(self, release: Callable[[str], None], *, interval: float = 1.0):
+        self._release = release
+        self._interval = interval
+        self._tracked: dict[str, AttemptFinishedEvent] = {}
+        self._task: asyncio.Task | None = None
+        self.released = 0
+        self.reaped = 0
+
+    def __len__(self) -> int:
+        return len(self._tracked)
+
+    def track(self, invocation_id: str, attempt_finished: AttemptFinishedEvent) -> None:
+        """Release the invocation's resources once its attempt has finished."""
+        self._tracked[invocation_id] = attempt_finished
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sweep_loop())
+
+    def release(self, invocation_id: str) -> None:
+        """Release the invocation's resources now, e.g. when the agent finished."""
+        self._tracked.pop(invocation_id, None)
+        self._release(invocation_id)
+        self.released += 1
+
+    def sweep(self) -> int:
+        """Release all tracked invocations whose attempt has finished."""
+        finished = [id for id, event in self._tracked.items() if event.is_set()]
+        for id in finished:
+            del self._tracked[id]
+            self._release(id)
+        self.reaped += len(finished)
+        return len(finished)
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._tracked.clear()
+
+    async def _sweep_loop(self):
+        while self._tracked:
+            await asyncio.sleep(self._interval)
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Failed to release finished invocations")
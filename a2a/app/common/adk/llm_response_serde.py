@@ -0,0 +1,47 @@
+from typing import Optional
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai.types import GenerateContentResponseUsageMetadata
+from restate.serde import Serde
+
+from app.common.adk import metrics
+
+# Log probabilities are only informational and are left out of the journal. Grounding and
+# citation metadata stay, agents with Google Search grounding show their sources from it.
+EXCLUDED_FIELDS = {"avg_logprobs", "logprobs_result"}
+
+# The token counts of the usage metadata, without the per-modality details
+JOURNALED_USAGE_FIELDS = {
+    "prompt_token_count",
+    "candidates_token_count",
+    "thoughts_token_count",
+    "cached_content_token_count",
+    "tool_use_prompt_token_count",
+    "total_token_count",
+}
+
+
+def compact_llm_response(response: LlmResponse) -> LlmResponse:
+    """Drop the fields of the response that are not journaled."""
+    update: dict = {field: None for field in EXCLUDED_FIELDS}
+    if response.usage_metadata is not None:
+        update["usage_metadata"] = GenerateContentResponseUsageMetadata(
+            **{field: getattr(response.usage_metadata, field) for field in JOURNALED_USAGE_FIELDS}
+        )
+    return response.model_copy(update=update)
+
+
+class CompactLlmResponseSerde(Serde[LlmResponse]):
+    """Journals an LlmResponse without its log probabilities, the per-modality token counts and null values."""
+
+    def deserialize(self, buf: bytes) -> Optional[LlmResponse]:
+        if not buf:
+            return None
+        return LlmResponse.model_validate_json(buf)
+
+    def serialize(self, obj: Optional[LlmResponse]) -> bytes:
+        if obj is None:
+            return b""
+        buf = obj.model_dump_json(exclude=EXCLUDED_FIELDS, exclude_none=True, by_alias=True).encode("utf-8")
+        metrics.journaled_model_response_bytes.record(len(buf))
+        return buf
@@ -0,0 +1,88 @@
+import asyncio
+
+
+class Lockstep:
+    """Lets the concurrent branches of an invocation run one at a time, in a fixed round-robin order.
+
+    The branches are the sub-agents of a ParallelAgent. A branch holds the turn while
+    it runs, and hands it to the next branch when it starts waiting for a model call.
+    So the model calls of all branches run concurrently, but everything else (events,
+    state, tool calls) happens one branch at a time. A branch that gets the turn back
+    first waits for its own model call, even if the call of another branch finished
+    earlier, which makes the journal the same on every replay of the invocation.
+
+    A branch that runs another ParallelAgent is replaced by the sub-branches of it,
+    and gets the turn back when the last of them has finished.
+    """
+
+    def __init__(self, root: str):
+        # the branches that take turns, in order. The root is the invocation itself.
+        self.ring = [root]
+        # mapping of branch to the event that signals that it is this branch's turn
+        self.events = {root: asyncio.Event()}
+        self.current = root
+        self.events[root].set()
+        # mapping of sub-branch to its parent branch, and of parent to its number of running sub-branches
+        self.parents: dict[str, str] = {}
+        self.running: dict[str, int] = {}
+        self.released = False
+
+    async def wait_for(self, branch: str) -> None:
+        """Wait until it is the turn of the given branch."""
+        event = self.events.get(branch)
+        if event is None or self.released:
+            return
+        await event.wait()
+
+    def pass_turn(self, branch: str) -> None:
+        """Give the turn of the given branch to the next branch in the ring."""
+        if branch != self.current or self.released:
+            return
+        index = self.ring.index(branch)
+        self._give_turn(self.ring[(index + 1) % len(self.ring)])
+
+    def split(self, branch: str, sub_branches: list[str]) -> None:
+        """Replace the branch by its sub-branches. The first sub-branch gets the turn."""
+        if branch not in self.events or not sub_branches or self.released:
+            return
+        index = self.ring.index(branch)
+        self.ring[index:index + 1] = sub_branches
+        for sub_branch in sub_branches:
+            self.events[sub_branch] = asyncio.Event()
+            self.parents[sub_branch] = branch
+        self.running[branch] = len(sub_branches)
+        self._give_turn(sub_branches[0])
+
+    def finish(self, branch: str) -> None:
+        """Remove a finished branch from the ring, the next branch gets the turn.
+
+        After the last sub-branch of a parent, the turn goes back to the parent.
+        """
+        if branch not in self.ring or self.released:
+            return
+        index = self.ring.index(branch)
+        self.ring.pop(index)
+        del self.events[branch]
+        parent = self.parents.pop(branch, None)
+        if parent is not None:
+            self.running[parent] -= 1
+            if self.running[parent] == 0:
+                del self.running[parent]
+                self.ring.insert(index, parent)
+                self._give_turn(parent)
+                return
+        if branch == self.current and self.ring:
+            self._give_turn(self.ring[index % len(self.ring)])
+
+    def release_all(self) -> None:
+        """Let every waiting branch go, e.g. when the invocation is finished."""
+        self.released = True
+        for event in self.events.values():
+            event.set()
+
+    def _give_turn(self, branch: str) -> None:
+        previous = self.events.get(self.current)
+        if previous is not None:
+            previous.clear()
+        self.current = branch
+        self.events[branch].set()
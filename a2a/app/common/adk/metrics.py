@@ -0,0 +1,88 @@
+"""OpenTelemetry metrics of the Restate ADK integration.
+
+These are no-ops unless the application configures an OpenTelemetry MeterProvider,
+for example with the Prometheus or OTLP exporter.
+"""
+
+import weakref
+from typing import Iterable, Protocol
+
+from opentelemetry import metrics
+from opentelemetry.metrics import CallbackOptions, Observation
+
+from app.common.adk.usage import InvocationUsage, TokenUsage
+
+meter = metrics.get_meter("app.common.adk")
+
+
+class _HasResourceStats(Protocol):
+    def resource_stats(self) -> dict[str, int]: ...
+
+
+_plugins: "weakref.WeakSet[_HasResourceStats]" = weakref.WeakSet()
+
+
+def register_plugin(plugin: _HasResourceStats) -> None:
+    """Report the live resources of this plugin instance."""
+    _plugins.add(plugin)
+
+
+def _observe_live_resources(options: CallbackOptions) -> Iterable[Observation]:
+    totals: dict[str, int] = {}
+    for plugin in list(_plugins):
+        for resource, count in plugin.resource_stats().items():
+            totals[resource] = totals.get(resource, 0) + count
+    return [Observation(count, {"resource": resource}) for resource, count in totals.items()]
+
+
+meter.create_observable_gauge(
+    "restate_adk.plugin.resources",
+    callbacks=[_observe_live_resources],
+    description="Per-invocation resources and release counters of all RestatePlugin instances.",
+)
+
+model_tokens = meter.create_counter(
+    "restate_adk.model.tokens",
+    unit="{token}",
+    description="Tokens used by model calls, by model, agent and token type.",
+)
+
+model_cost = meter.create_counter(
+    "restate_adk.model.cost",
+    unit="USD",
+    description="Cost of model calls with a configured price, by model and agent.",
+)
+
+invocation_tokens = meter.create_histogram(
+    "restate_adk.invocation.tokens",
+    unit="{token}",
+    description="Total tokens used by each agent invocation, by root agent.",
+)
+
+
+def record_model_usage(model: str, agent_name: str, usage: TokenUsage) -> None:
+    """Report the usage of one model call. Called once per executed model call, not on replays."""
+    attributes = {"model": model, "agent": agent_name}
+    for token_type, count in (
+        ("prompt", usage.prompt_tokens),
+        ("candidates", usage.candidates_tokens),
+        ("thoughts", usage.thoughts_tokens),
+        ("cached", usage.cached_tokens),
+        ("tool_use_prompt", usage.tool_use_prompt_tokens),
+    ):
+        if count:
+            model_tokens.add(count, {**attributes, "type": token_type})
+    if usage.cost:
+        model_cost.add(usage.cost, attributes)
+
+
+def record_invocation_usage(root_agent: str, usage: InvocationUsage) -> None:
+    """Report the total usage of a finished invocation."""
+    invocation_tokens.record(usage.total.total_tokens, {"agent": root_agent})
+
+
+journaled_model_response_bytes = meter.create_histogram(
+    "restate_adk.model.journaled_bytes",
+    unit="By",
+    description="Size of the journal entry of each model call.",
+)
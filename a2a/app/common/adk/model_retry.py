@@ -0,0 +1,236 @@
+import asyncio
+import email.utils
+import enum
+import logging
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import httpx
+import restate
+
+from app.common.adk import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+model_call_retries = metrics.meter.create_counter(
+    "restate_adk.model.retries",
+    description="Retried model calls, by model and error kind.",
+)
+
+
+class ModelErrorKind(enum.Enum):
+    RATE_LIMIT = "rate_limit"
+    TRANSIENT = "transient"
+    TERMINAL = "terminal"
+    # Not a provider error, left to the retry policy of the Restate step
+    UNKNOWN = "unknown"
+
+
+_RATE_LIMIT_CODES = {429}
+_TRANSIENT_CODES = {408, 409, 500, 502, 503, 504}
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    # google.genai APIError has `code`, LiteLLM and httpx errors have `status_code`
+    for attribute in ("status_code", "code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int):
+            return code
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def classify_model_error(error: BaseException) -> ModelErrorKind:
+    """Decide whether a failed model call is throttled, worth retrying, or will never succeed."""
+    if isinstance(error, restate.TerminalError):
+        return ModelErrorKind.TERMINAL
+    code = _status_code(error)
+    if code is None:
+        if isinstance(error, (httpx.TransportError, TimeoutError, ConnectionError)):
+            return ModelErrorKind.TRANSIENT
+        # e.g. a bug in a callback: retrying it here won't help
+        return ModelErrorKind.UNKNOWN
+    if code in _RATE_LIMIT_CODES:
+        return ModelErrorKind.RATE_LIMIT
+    if code in _TRANSIENT_CODES or code >= 500:
+        return ModelErrorKind.TRANSIENT
+    # Other 4xx: malformed request, authentication, unknown model, ...
+    return ModelErrorKind.TERMINAL
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """The delay in seconds the provider asked for, from the Retry-After header or the RetryInfo details."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    # Gemini returns e.g. {"error": {"details": [{"@type": ".../google.rpc.RetryInfo", "retryDelay": "12s"}]}}
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []) or []:
+            match = re.fullmatch(r"([\d.]+)s", str(detail.get("retryDelay", "")))
+            if match:
+                return float(match.group(1))
+    return None
+
+
+class CircuitBreaker:
+    """Pauses all calls to one model in this process after throttling or repeated failures.
+
+    A rate-limit response pauses the model for the requested Retry-After, and
+    `failure_threshold` consecutive retryable failures pause it for `cooldown`.
+    Callers wait for the pause to end instead of adding more load to the provider.
+    """
+
+    def __init__(self, *, failure_threshold: int, cooldown: timedelta):
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown.total_seconds()
+        self._failures = 0
+        self._open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_until > time.monotonic()
+
+    @property
+    def remaining(self) -> float:
+        """Seconds until the breaker closes, 0 if it is closed."""
+        return max(0.0, self._open_until - time.monotonic())
+
+    async def wait_until_closed(self) -> None:
+        while (remaining := self._open_until - time.monotonic()) > 0:
+            # spread the waiting callers a bit, so they don't all hit the provider at once
+            await asyncio.sleep(remaining + random.uniform(0, remaining * 0.1))
+
+    def record_success(self) -> None:
+        self._failures = 0
+
+    def record_failure(self, pause: Optional[float] = None) -> None:
+        self._failures += 1
+        now = time.monotonic()
+        if pause:
+            self._open_until = max(self._open_until, now + pause)
+        if self._failures >= self._failure_threshold:
+            logger.warning("Pausing model calls for %ss after %s failures", self._cooldown, self._failures)
+            self._open_until = max(self._open_until, now + self._cooldown)
+            self._failures = 0
+
+
+@dataclass(frozen=True)
+class ModelRetryPolicy:
+    """How the RestatePlugin retries model calls.
+
+    Attributes:
+        max_attempts: Attempts per model call. After the last one the call fails with a TerminalError.
+        initial_interval: Backoff before the second attempt.
+        max_interval: Upper bound of the exponential backoff.
+        interval_factor: Growth of the backoff per attempt.
+        max_retry_after: Upper bound for a Retry-After requested by the provider.
+        failure_threshold: Consecutive failures after which the circuit breaker of the model opens.
+        cooldown: How long an opened circuit breaker stays open.
+        max_wait_in_step: Upper bound of the time a model call step waits in total, for backoff,
+            Retry-After and open circuit breakers. The invocation makes no progress while the step
+            waits, so Restate would time it out as inactive. A longer wait fails the attempt of the
+            step instead, and Restate retries the step later, with the invocation suspended.
+    """
+
+    max_attempts: int = 3
+    initial_interval: timedelta = timedelta(seconds=1)
+    max_interval: timedelta = timedelta(seconds=30)
+    interval_factor: float = 2.0
+    max_retry_after: timedelta = timedelta(seconds=60)
+    failure_threshold: int = 5
+    cooldown: timedelta = timedelta(seconds=30)
+    max_wait_in_step: timedelta = timedelta(seconds=15)
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter, in seconds, after the given (1-based) attempt."""
+        interval = self.initial_interval.total_seconds() * self.interval_factor ** (attempt - 1)
+        return random.uniform(0, min(interval, self.max_interval.total_seconds()))
+
+    def step_options(self) -> dict:
+        """Retry options of the model call step, for waits that are too long to spend in the step."""
+        return {
+            "max_attempts": self.max_attempts,
+            "initial_retry_interval": self.max_wait_in_step,
+            "max_retry_interval": max(self.max_retry_after, self.cooldown),
+            "retry_interval_factor": self.interval_factor,
+        }
+
+
+class ModelCallDeferred(Exception):
+    """A model call has to wait longer than its step may, Restate retries the step later."""
+
+
+# Circuit breakers are shared by all invocations in the process
+_circuit_breakers: dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def circuit_breaker(model: str, policy: ModelRetryPolicy) -> CircuitBreaker:
+    """Get the circuit breaker of the given model, create it on first use."""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(model)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold=policy.failure_threshold, cooldown=policy.cooldown)
+            _circuit_breakers[model] = breaker
+        return breaker
+
+
+async def call_with_retries(model: str, policy: ModelRetryPolicy, call: Callable[[], Awaitable[T]]) -> T:
+    """Call the model, retrying rate-limited and transient failures according to the policy.
+
+    Runs inside the journaled model call step, so only the final outcome is journaled.
+    Errors that are not provider or network errors are raised as they are, without
+    retries here, and the step fails with them like any other step. So does a wait
+    that would exceed policy.max_wait_in_step, as a ModelCallDeferred.
+    """
+    breaker = circuit_breaker(model, policy)
+    deadline = time.monotonic() + policy.max_wait_in_step.total_seconds()
+    attempt = 1
+    while True:
+        if time.monotonic() + breaker.remaining > deadline:
+            raise ModelCallDeferred(f"Model calls to {model} are paused for {breaker.remaining:.1f}s")
+        await breaker.wait_until_closed()
+        try:
+            result = await call()
+            breaker.record_success()
+            return result
+        except Exception as e:
+            kind = classify_model_error(e)
+            if kind is ModelErrorKind.UNKNOWN:
+                raise
+            if kind is ModelErrorKind.TERMINAL:
+                if isinstance(e, restate.TerminalError):
+                    raise
+                raise restate.TerminalError(f"Model call failed: {e}") from e
+            requested = retry_after(e) if kind is ModelErrorKind.RATE_LIMIT else None
+            if requested is not None:
+                requested = min(requested, policy.max_retry_after.total_seconds())
+            breaker.record_failure(requested)
+            if attempt >= policy.max_attempts:
+                raise restate.TerminalError(f"Model call failed after {attempt} attempts: {e}") from e
+            model_call_retries.add(1, {"model": model, "kind": kind.value})
+            delay = requested if requested is not None else policy.backoff(attempt)
+            if time.monotonic() + delay > deadline:
+                raise ModelCallDeferred(f"Model call failed ({kind.value}), retrying in {delay:.1f}s: {e}") from e
+            logger.info("Model call failed (%s), attempt %s of %s, retrying in %.1fs: %s",
+                        kind.value, attempt, policy.max_attempts, delay, e)
+            await asyncio.sleep(delay)
+            attempt += 1
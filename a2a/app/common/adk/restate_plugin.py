@@ -1,73 +1,188 @@
-from typing import Optional, Any
+from dataclasses import dataclass, field
+from typing import Optional, Any, Awaitable, Callable
 import asyncio
+import contextvars
+import typing
 
-from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents import BaseAgent, LlmAgent, ParallelAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.adk.plugins import BasePlugin
 from google.adk.tools import BaseTool, ToolContext
 from google.genai import types
 from google.adk.models.llm_request import LlmRequest
 from google.adk.models.llm_response import LlmResponse
-from google.adk.models import LLMRegistry
 from google.adk.models.base_llm import BaseLlm
 from google.adk.flows.llm_flows.functions import generate_client_function_call_id
 
 import restate
 
+from app.common.adk import metrics
+from app.common.adk.durable_tools import (
+    DurableToolOptions,
+    ToolResultCache,
+    durable_tool_options,
+    tool_result_to_dict,
+)
+from app.common.adk.invocation_reaper import InvocationReaper
+from app.common.adk.lockstep import Lockstep
+from app.common.adk.llm_response_serde import CompactLlmResponseSerde, compact_llm_response
+from app.common.adk.model_retry import ModelRetryPolicy, call_with_retries
 from app.common.adk.restate_utils import current_restate_context
+from app.common.adk.shared_models import get_shared_model
+from app.common.adk.turnstile import Turnstile
+from app.common.adk.usage import USAGE_LEDGER_KEY, InvocationUsage, ModelPrice, TokenUsage, UsageLedger
 
 
 class RestatePlugin(BasePlugin):
-    """A plugin to integrate Restate with the ADK framework."""
+    """A plugin to integrate Restate with the ADK framework.
 
-    _models: dict[str, BaseLlm]
-    _locks: dict[str, asyncio.Lock]
+    Args:
+        max_model_call_retries: Maximum number of attempts for each model call.
+            Shorthand for retry_policy=ModelRetryPolicy(max_attempts=...).
+        retry_policy: How model calls are retried. Rate-limited calls wait for the
+            provider's Retry-After, transient failures back off exponentially with jitter,
+            and invalid requests fail immediately. Throttling and repeated failures pause
+            all calls to the same model in the process (see CircuitBreaker).
+        parallel_tool_calls: If True, the function calls of one model response run
+            concurrently instead of one after the other. They still start in the
+            order of their (journaled) function call IDs, so the durable steps they
+            create are recorded in the same order on every replay. Only enable this
+            for tools that issue their durable steps (ctx.run, calls, ...) before
+            awaiting anything else.
+        model_chunk_sink: If set, model calls are streamed and every partial response
+            is passed to this callback (with the ADK invocation ID) as soon as it
+            arrives, e.g. to push it to a UI. Only the aggregated final response is
+            journaled, so replays return it without calling the model or the sink again.
+            Chunks of an attempt that fails and is retried are sent again.
+        tool_cache: Memo cache for the results of tools marked with @durable_tool(pure=True).
+            Defaults to a cache shared by all plugins in the process.
+        model_prices: Prices per model name, to account the cost of model calls next to the tokens.
+        usage_ledger: If True, the token usage of every invocation is added to a UsageLedger in the
+            state of the virtual object that runs the agent (see get_usage_ledger), when the invocation
+            finishes. Requires the agent to run in a virtual object handler, like the RestateSessionService.
 
-    def __init__(self, *, max_model_call_retries: int = 3):
+    The token usage of each model call is journaled together with the response, and reported
+    through the metrics per model and agent, and per invocation when the invocation finishes.
+
+    Workflow agents (SequentialAgent, LoopAgent, ParallelAgent) are supported. The
+    branches of a ParallelAgent take turns (see Lockstep): their model calls run
+    concurrently, everything else runs one branch at a time in a fixed order.
+    """
+
+    _invocations: dict[str, "_InvocationState"]
+
+    def __init__(
+            self,
+            *,
+            max_model_call_retries: int = 3,
+            retry_policy: Optional[ModelRetryPolicy] = None,
+            parallel_tool_calls: bool = False,
+            model_chunk_sink: Optional[Callable[[str, LlmResponse], Awaitable[None]]] = None,
+            tool_cache: Optional[ToolResultCache] = None,
+            model_prices: Optional[dict[str, ModelPrice]] = None,
+            usage_ledger: bool = False,
+    ):
         super().__init__(name="restate_plugin")
-        self._models = {}
-        self._locks = {}
-        self._max_model_call_retries = max_model_call_retries
+        self._invocations = {}
+        self._retry_policy = retry_policy or ModelRetryPolicy(max_attempts=max_model_call_retries)
+        self._parallel_tool_calls = parallel_tool_calls
+        self._model_chunk_sink = model_chunk_sink
+        self._tool_cache = tool_cache if tool_cache is not None else _shared_tool_cache
+        self._model_prices = model_prices or {}
+        self._usage_ledger = usage_ledger
+        self._reaper = InvocationReaper(self._release_invocation)
+        metrics.register_plugin(self)
 
     async def before_agent_callback(self, *, agent: BaseAgent, callback_context: CallbackContext) -> Optional[
         types.Content]:
-        if not isinstance(agent, LlmAgent):
-            raise restate.TerminalError("RestatePlugin only supports LlmAgent agents.")
         ctx = current_restate_context()  # Ensure we have a Restate context
         if ctx is None:
             raise restate.TerminalError("""No Restate context found for RestatePlugin.
             Ensure that the agent is invoked within a restate handler and,
             using a ```with restate_overrides(ctx):``` block. around your agent use.""")
-        model = agent.model if isinstance(agent.model, BaseLlm) else LLMRegistry.new_llm(agent.model)
-        self._models[callback_context.invocation_id] = model
-        self._locks[callback_context.invocation_id] = asyncio.Lock()
-
-        id = callback_context.invocation_id
-        event = ctx.request().attempt_finished_event
-
-        async def release_task():
-            """make sure to release resources when the agent finishes"""
-            try:
-                await event.wait()
-            finally:
-                self._models.pop(id, None)
-                self._locks.pop(id, None)
-
-        _ = asyncio.create_task(release_task())
+        invocation_id = callback_context.invocation_id
+        state = self._invocations.get(invocation_id)
+        if state is None:
+            state = self._invocations[invocation_id] = _InvocationState(
+                root_agent=agent.name, usage=InvocationUsage(invocation_id=invocation_id)
+            )
+            # make sure to release resources if the attempt ends before the agent finishes
+            self._reaper.track(invocation_id, ctx.request().attempt_finished_event)
+        state.running_agents += 1
+
+        if isinstance(agent.parent_agent, ParallelAgent) and state.lockstep is not None:
+            # This agent is a branch of a ParallelAgent, running in its own task
+            _current_branch.set(agent.name)
+            lockstep = state.lockstep
+            # The branch is finished when its task is done, also if it fails or is cancelled
+            task = asyncio.current_task()
+            assert task is not None
+            task.add_done_callback(lambda _: lockstep.finish(agent.name))
+        if state.lockstep is not None:
+            await state.lockstep.wait_for(_current_branch.get())
+
+        if isinstance(agent, ParallelAgent) and agent.sub_agents:
+            # A resumed ParallelAgent only starts the branches that didn't finish before
+            finished = _finished_agents(callback_context)
+            branches = [sub_agent.name for sub_agent in agent.sub_agents if sub_agent.name not in finished]
+            if state.lockstep is None:
+                state.lockstep = Lockstep(_current_branch.get())
+            state.lockstep.split(_current_branch.get(), branches)
+        if isinstance(agent, LlmAgent):
+            model = agent.model if isinstance(agent.model, BaseLlm) else get_shared_model(agent.model)
+            state.models[agent.name] = model
+            state.turnstiles[agent.name] = Turnstile([])
         return None
 
     async def after_agent_callback(
             self, *, agent: BaseAgent, callback_context: CallbackContext
     ) -> Optional[types.Content]:
-        self._models.pop(callback_context.invocation_id, None)
-        self._locks.pop(callback_context.invocation_id, None)
+        state = self._invocations.get(callback_context.invocation_id)
+        if state is None:
+            return None
+        state.running_agents -= 1
+        if state.running_agents == 0:
+            metrics.record_invocation_usage(state.root_agent, state.usage)
+            if self._usage_ledger:
+                ctx = typing.cast(restate.ObjectContext, current_restate_context())
+                ledger = await ctx.get(USAGE_LEDGER_KEY, type_hint=UsageLedger) or UsageLedger()
+                ledger.add(state.usage)
+                ctx.set(USAGE_LEDGER_KEY, ledger)
+            self._reaper.release(callback_context.invocation_id)
         return None
 
     async def before_model_callback(self, *, callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[
         LlmResponse]:
-        model = self._models[callback_context.invocation_id]
+        state = self._invocations[callback_context.invocation_id]
+        agent_name = callback_context.agent_name
+        model = state.models[agent_name]
+        price = self._model_prices.get(model.model)
         ctx = current_restate_context()
-        response = await _generate_content_async(ctx, self._max_model_call_retries, model, llm_request)
+
+        def on_usage(usage: Optional[types.GenerateContentResponseUsageMetadata]) -> None:
+            metrics.record_model_usage(model.model, agent_name, TokenUsage.from_metadata(usage, price))
+
+        on_chunk = None
+        if self._model_chunk_sink is not None:
+            sink, invocation_id = self._model_chunk_sink, callback_context.invocation_id
+
+            async def on_chunk(chunk: LlmResponse) -> None:
+                await sink(invocation_id, chunk)
+
+        lockstep, branch = state.lockstep, _current_branch.get()
+        if lockstep is None:
+            response = await _model_call_step(ctx, self._retry_policy, model, llm_request, on_chunk, on_usage)
+        else:
+            await lockstep.wait_for(branch)
+            step = _model_call_step(ctx, self._retry_policy, model, llm_request, on_chunk, on_usage)
+            # The other branches can issue their model calls while this one runs
+            lockstep.pass_turn(branch)
+            response = await step
+            await lockstep.wait_for(branch)
+        # The usage is journaled with the response, so this is the same on replays
+        state.usage.add(agent_name, TokenUsage.from_metadata(response.usage_metadata, price))
+        # The function calls of this response are executed in the order of their IDs
+        state.turnstiles[agent_name] = Turnstile(_get_function_call_ids(response))
         return response
 
     async def before_tool_callback(
@@ -77,11 +192,25 @@ class RestatePlugin(BasePlugin):
             tool_args: dict[str, Any],
             tool_context: ToolContext,
     ) -> Optional[dict]:
+        turnstile = self._turnstile(tool_context)
+        await turnstile.wait_for(tool_context.function_call_id)
+        # Set only after our turn, the previous tool removes it when it finishes
         tool_context.session.state["restate_context"] = current_restate_context()
-        lock = self._locks[tool_context.invocation_id]
-        await lock.acquire()
-        # TODO: if we want we can also automatically wrap tools with ctx.run_typed here
-        return None
+        if self._parallel_tool_calls:
+            # The next tool wakes up once this one yields, which is after it has
+            # issued its first durable step.
+            turnstile.allow_next_after(tool_context.function_call_id)
+
+        options = durable_tool_options(tool)
+        if options is None:
+            return None
+        try:
+            # Returning the result makes ADK skip its own call of the tool
+            return await self._run_durable_tool(tool, tool_args, tool_context, options)
+        except BaseException:
+            # ADK doesn't call the tool error callback for errors raised here
+            self._tool_finished(tool_context)
+            raise
 
     async def after_tool_callback(
             self,
@@ -91,21 +220,113 @@ class RestatePlugin(BasePlugin):
             tool_context: ToolContext,
             result: dict,
     ) -> Optional[dict]:
-        lock = self._locks[tool_context.invocation_id]
-        lock.release()
-        tool_context.session.state.pop("restate_context", None)
+        self._tool_finished(tool_context)
         return None
 
     async def on_tool_error_callback(self, *, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext,
                                      error: Exception) -> Optional[dict]:
-        lock = self._locks[tool_context.invocation_id]
-        lock.release()
-        tool_context.session.state.pop("restate_context", None)
+        self._tool_finished(tool_context)
         return None
 
     async def close(self):
-        self._models.clear()
-        self._locks.clear()
+        self._reaper.close()
+        for invocation_id in list(self._invocations.keys()):
+            self._release_invocation(invocation_id)
+
+    def resource_stats(self) -> dict[str, int]:
+        """Live per-invocation resources and release counters, to check that they stay bounded."""
+        return {
+            "invocations": len(self._invocations),
+            "models": sum(len(state.models) for state in self._invocations.values()),
+            "turnstiles": sum(len(state.turnstiles) for state in self._invocations.values()),
+            "tracked_invocations": len(self._reaper),
+            "released": self._reaper.released,
+            "reaped": self._reaper.reaped,
+        }
+
+    async def _run_durable_tool(self, tool: BaseTool, tool_args: dict[str, Any], tool_context: ToolContext,
+                                options: DurableToolOptions) -> dict:
+        """Run a tool marked with @durable_tool as a single journaled step."""
+        cache = self._tool_cache if options.pure else None
+        key = ToolResultCache.key(tool.name, tool_args)
+
+        async def call_tool() -> dict:
+            if cache is not None and (cached := cache.get(key)) is not None:
+                return cached
+            result = tool_result_to_dict(await tool.run_async(args=tool_args, tool_context=tool_context))
+            if cache is not None and "error" not in result:
+                cache.put(key, result, options.ttl)
+            return result
+
+        ctx = current_restate_context()
+        return await ctx.run_typed(
+            f"call tool {tool.name}", call_tool, restate.RunOptions(max_attempts=options.max_attempts)
+        )
+
+    def _tool_finished(self, tool_context: ToolContext) -> None:
+        if self._parallel_tool_calls:
+            # Other tools of the same response might still be running and reading the context.
+            # The session service strips it before storing the session.
+            return
+        self._turnstile(tool_context).allow_next_after(tool_context.function_call_id)
+        tool_context.session.state.pop("restate_context", None)
+
+    def _turnstile(self, tool_context: ToolContext) -> Turnstile:
+        return self._invocations[tool_context.invocation_id].turnstiles[tool_context.agent_name]
+
+    def _release_invocation(self, invocation_id: str) -> None:
+        state = self._invocations.pop(invocation_id, None)
+        if state is None:
+            return
+        for turnstile in state.turnstiles.values():
+            turnstile.release_all()
+        if state.lockstep is not None:
+            state.lockstep.release_all()
+
+
+@dataclass
+class _InvocationState:
+    """The per-invocation state of the plugin. Models and turnstiles are kept per agent,
+    as the branches of a ParallelAgent run their agents concurrently in the same invocation."""
+
+    root_agent: str
+    usage: InvocationUsage
+    models: dict[str, BaseLlm] = field(default_factory=dict)
+    turnstiles: dict[str, Turnstile] = field(default_factory=dict)
+    # created when the invocation runs its first ParallelAgent
+    lockstep: Optional[Lockstep] = None
+    # number of agents that started and didn't finish yet, the invocation is done at zero
+    running_agents: int = 0
+
+
+# The ParallelAgent branch that the current task runs, "" outside of branches
+_current_branch = contextvars.ContextVar[str]("restate_adk_branch", default="")
+
+
+_shared_tool_cache = ToolResultCache()
+
+
+def _finished_agents(callback_context: CallbackContext) -> set[str]:
+    """The agents that finished in an earlier run of this invocation, as ADK's resumability tracks them."""
+    finished = set()
+    for event in callback_context.session.events:
+        if event.invocation_id != callback_context.invocation_id:
+            continue
+        if event.actions.end_of_agent:
+            finished.add(event.author)
+        elif event.actions.agent_state is not None:
+            finished.discard(event.author)
+    return finished
+
+
+def _get_function_call_ids(s: LlmResponse) -> list[str]:
+    """Get the function call IDs of the LlmResponse, in order."""
+    ids = []
+    if s.content and s.content.parts:
+        for part in s.content.parts:
+            if part.function_call and part.function_call.id:
+                ids.append(part.function_call.id)
+    return ids
 
 
 def _generate_client_function_call_id(s: LlmResponse) -> None:
@@ -121,19 +342,67 @@ def _generate_client_function_call_id(s: LlmResponse) -> None:
                     part.function_call.id = id
 
 
-async def _generate_content_async(ctx: restate.Context, max_attempts: int, model: BaseLlm,
-                                  llm_request: LlmRequest) -> LlmResponse:
-    """Generate content using Restate's context."""
+def _aggregate_stream(responses: list[LlmResponse]) -> LlmResponse:
+    """Merge the complete (non-partial) responses of a model stream into a single response.
 
-    async def call_llm() -> LlmResponse:
-        a_gen = model.generate_content_async(llm_request, stream=False)
+    ADK models mark the text chunks of a stream as partial and emit the merged text as
+    a complete response, next to complete responses for function calls and the end of
+    the stream.
+    """
+    complete = [r for r in responses if not r.partial] or responses[-1:]
+    if not complete:
+        raise RuntimeError("The model stream ended without a response.")
+    parts = [part for r in complete if r.content and r.content.parts for part in r.content.parts]
+    aggregated = complete[-1].model_copy()
+    aggregated.partial = None
+    aggregated.content = types.ModelContent(parts=parts) if parts else complete[-1].content
+    usage = [r.usage_metadata for r in responses if r.usage_metadata]
+    if usage:
+        aggregated.usage_metadata = usage[-1]
+    return aggregated
+
+
+def _model_call_step(ctx: restate.Context, retry_policy: ModelRetryPolicy, model: BaseLlm,
+                     llm_request: LlmRequest,
+                     on_chunk: Optional[Callable[[LlmResponse], Awaitable[None]]] = None,
+                     on_usage: Optional[Callable[[Optional[types.GenerateContentResponseUsageMetadata]], None]] = None,
+                     ) -> restate.RestateDurableFuture[LlmResponse]:
+    """Generate content using Restate's context.
+
+    The journal entry is created when this is called, the model is called once the
+    returned future is awaited.
+
+    If on_chunk is set, the model is called in streaming mode. The partial responses go
+    to on_chunk and only the aggregated response is journaled.
+    """
+
+    async def call_model() -> LlmResponse:
+        a_gen = model.generate_content_async(llm_request, stream=on_chunk is not None)
         try:
-            result = await anext(a_gen)
+            if on_chunk is None:
+                result = await anext(a_gen)
+            else:
+                responses = []
+                async for chunk in a_gen:
+                    responses.append(chunk)
+                    if chunk.partial:
+                        await on_chunk(chunk)
+                result = _aggregate_stream(responses)
             _generate_client_function_call_id(result)
-            return result
+            if on_usage is not None:
+                # Only here, so that replays don't report the usage again
+                on_usage(result.usage_metadata)
+            # The journal only keeps what the agent needs on replay. The compact response
+            # is also returned on the first execution, so it sees the same as a replay.
+            return compact_llm_response(result)
         finally:
             await a_gen.aclose()
 
-    return await ctx.run_typed(
-        "call LLM", call_llm, restate.RunOptions(max_attempts=max_attempts)
+    async def call_llm() -> LlmResponse:
+        return await call_with_retries(model.model, retry_policy, call_model)
+
+    # Provider errors are retried inside the step, call_with_retries turns the final failure into a
+    # TerminalError. Other errors, and waits too long for the step, are retried by Restate.
+    return ctx.run_typed(
+        "call LLM", call_llm, restate.RunOptions(serde=CompactLlmResponseSerde(), **retry_policy.step_options())
     )
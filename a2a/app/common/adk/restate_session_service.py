@@ -2,6 +2,7 @@ from typing import Optional, Any, override
 import typing
 
 import restate
+from pydantic import BaseModel
 from google.adk.sessions import Session
 from google.adk.events.event import Event
 from google.adk.sessions.base_session_service import (
@@ -13,6 +14,12 @@ from google.adk.sessions.base_session_service import (
 from app.common.adk.restate_utils import current_restate_context
 
 
+class SessionArchive(BaseModel):
+    """Events that were removed from the session by a compaction."""
+
+    events: list[Event]
+
+
 # Translation layer between Restate's K/V store and ADK's session service interface.
 class RestateSessionService(BaseSessionService):
 
@@ -70,6 +77,27 @@ class RestateSessionService(BaseSessionService):
     ) -> None:
         self.ctx().clear("session")
 
+    async def compact_events(self, session: Session, compaction: Event, compacted: list[Event]) -> None:
+        """Replace the compacted events of the session by the compaction event, and archive them.
+
+        The compaction event has to come from a journaled step. The archived events are stored
+        in separate state keys, so they are no longer loaded with the session, but are still
+        available for auditing.
+        """
+        archive_size = await self.ctx().get("session_archive_size", type_hint=int) or 0
+        self.ctx().set(f"session_archive::{archive_size}", SessionArchive(events=compacted))
+        self.ctx().set("session_archive_size", archive_size + 1)
+
+        compacted_ids = {event.id for event in compacted}
+        session.events[:] = [compaction] + [event for event in session.events if event.id not in compacted_ids]
+        self._store_session(session)
+
+    def _store_session(self, session: Session) -> None:
+        session_to_store = session.model_copy()
+        # Remove restate-specific context that got added by the plugin before storing
+        session_to_store.state.pop("restate_context", None)
+        self.ctx().set("session", session_to_store)
+
     @override
     async def append_event(self, session: Session, event: Event) -> Event:
         """Appends an event to a session object."""
@@ -84,9 +112,5 @@ class RestateSessionService(BaseSessionService):
         event = self._trim_temp_delta_state(event)
         self._update_session_state(session, event)
         session.events.append(event)
-
-        session_to_store = session.model_copy()
-        # Remove restate-specific context that got added by the plugin before storing
-        session_to_store.state.pop("restate_context", None)
-        self.ctx().set("session", session_to_store)
+        self._store_session(session)
         return event
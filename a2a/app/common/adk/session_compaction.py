@@ -0,0 +1,130 @@
+import logging
+from typing import Optional
+
+import restate
+from google.adk.agents import LlmAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.apps.base_events_summarizer import BaseEventsSummarizer
+from google.adk.apps.llm_event_summarizer import LlmEventSummarizer
+from google.adk.events.event import Event
+from google.adk.models.base_llm import BaseLlm
+from google.adk.plugins import BasePlugin
+
+from app.common.adk import metrics
+from app.common.adk.restate_session_service import RestateSessionService
+from app.common.adk.restate_utils import current_restate_context
+from app.common.adk.shared_models import get_shared_model
+
+logger = logging.getLogger(__name__)
+
+compacted_tokens = metrics.meter.create_histogram(
+    "restate_adk.session.compacted_tokens",
+    unit="{token}",
+    description="Estimated tokens of the session events before and after each compaction, by stage (before/after).",
+)
+
+
+def estimate_tokens(events: list[Event]) -> int:
+    """Rough token count of the events as they are sent to the model, about 4 characters per token."""
+    characters = 0
+    for event in events:
+        content = event.content
+        if event.actions and event.actions.compaction:
+            content = event.actions.compaction.compacted_content
+        if content and content.parts:
+            for part in content.parts:
+                if part.text:
+                    characters += len(part.text)
+                elif part.function_call or part.function_response:
+                    characters += len(part.model_dump_json(exclude_none=True))
+    return characters // 4
+
+
+class SessionCompactionPlugin(BasePlugin):
+    """Compacts the session when its events pass a token budget.
+
+    After each invocation, if the events of the session are estimated to take more than
+    `token_budget` tokens, all but the most recent `keep_recent_invocations` invocations
+    are replaced by a summary (an ADK compaction event). The previous summary is included
+    in the new one. The summarization is a journaled step, and the replaced events are
+    moved to the archive of the RestateSessionService, out of the session state that is
+    loaded and sent to the model on every turn.
+
+    Add it to the plugins of the App, after the RestatePlugin. Requires the RestateSessionService.
+
+    Args:
+        token_budget: Estimated tokens (see estimate_tokens) above which the session is compacted.
+        keep_recent_invocations: Number of the most recent invocations that are kept as they are.
+        summarizer: Summarizes the compacted events. Defaults to an LlmEventSummarizer
+            with the model of the root agent.
+    """
+
+    def __init__(
+            self,
+            *,
+            token_budget: int = 8_000,
+            keep_recent_invocations: int = 2,
+            summarizer: Optional[BaseEventsSummarizer] = None,
+    ):
+        super().__init__(name="session_compaction_plugin")
+        self._token_budget = token_budget
+        self._keep_recent_invocations = keep_recent_invocations
+        self._summarizer = summarizer
+
+    async def after_run_callback(self, *, invocation_context: InvocationContext) -> None:
+        session = invocation_context.session
+        session_service = invocation_context.session_service
+        if not isinstance(session_service, RestateSessionService):
+            raise restate.TerminalError("SessionCompactionPlugin requires the RestateSessionService.")
+        tokens = estimate_tokens(session.events)
+        if tokens <= self._token_budget:
+            return
+
+        previous = [event for event in session.events if event.actions and event.actions.compaction]
+        events = [event for event in session.events if not (event.actions and event.actions.compaction)]
+        invocation_ids = list(dict.fromkeys(event.invocation_id for event in events))
+        recent = set(invocation_ids[-self._keep_recent_invocations:]) if self._keep_recent_invocations else set()
+        compacted = [event for event in events if event.invocation_id not in recent]
+        if not compacted:
+            return
+
+        # The new summary has to include the previous one, as its events are archived
+        to_summarize = [_summary_as_event(event) for event in previous] + compacted
+        summarizer = self._summarizer or LlmEventSummarizer(llm=_root_model(invocation_context))
+
+        async def summarize() -> Optional[Event]:
+            return await summarizer.maybe_summarize_events(events=to_summarize)
+
+        ctx = current_restate_context()
+        try:
+            compaction = await ctx.run_typed("summarize session", summarize, restate.RunOptions(max_attempts=3))
+        except restate.TerminalError as e:
+            # The answer was already given, a failed summary shouldn't fail the invocation
+            logger.warning("Failed to compact session %s, trying again after the next turn: %s", session.id, e)
+            return
+        if compaction is None:
+            return
+        await session_service.compact_events(session, compaction, previous + compacted)
+        compacted_tokens.record(tokens, {"stage": "before"})
+        compacted_tokens.record(estimate_tokens(session.events), {"stage": "after"})
+
+
+def _summary_as_event(compaction_event: Event) -> Event:
+    """The summary of a previous compaction, as a regular event covering its time range."""
+    compaction = compaction_event.actions.compaction
+    assert compaction is not None
+    return Event(
+        author="model",
+        invocation_id=compaction_event.invocation_id,
+        timestamp=compaction.start_timestamp,
+        content=compaction.compacted_content,
+    )
+
+
+def _root_model(invocation_context: InvocationContext) -> BaseLlm:
+    root_agent = invocation_context.agent.root_agent
+    if not isinstance(root_agent, LlmAgent):
+        raise restate.TerminalError("SessionCompactionPlugin needs a summarizer if the root agent is not an LlmAgent.")
+    if isinstance(root_agent.model, BaseLlm):
+        return root_agent.model
+    return get_shared_model(root_agent.canonical_model.model)
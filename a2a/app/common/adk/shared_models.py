@@ -0,0 +1,23 @@
+import threading
+
+from google.adk.models import LLMRegistry
+from google.adk.models.base_llm import BaseLlm
+
+# Model instances are shared by all invocations in the process, so that their
+# API clients (and HTTP connection pools) are reused instead of created per request.
+_shared_models: dict[tuple[type[BaseLlm], str], BaseLlm] = {}
+_shared_models_lock = threading.Lock()
+
+
+def get_shared_model(model: str) -> BaseLlm:
+    """Get the shared model instance for the given model name, create it on first use."""
+    key = (LLMRegistry.resolve(model), model)
+    shared = _shared_models.get(key)
+    if shared is not None:
+        return shared
+    with _shared_models_lock:
+        shared = _shared_models.get(key)
+        if shared is None:
+            shared = key[0](model=model)
+            _shared_models[key] = shared
+        return shared
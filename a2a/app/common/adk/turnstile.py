@@ -0,0 +1,40 @@
+import asyncio
+
+
+class Turnstile:
+    """Lets the tool calls of one model response through in a fixed order.
+
+    The order is the order of the function call IDs in the model response.
+    These IDs are journaled together with the response, so the order is the
+    same on every replay of the invocation.
+    """
+
+    def __init__(self, ids: list[str]):
+        # ordered mapping of id to the next id in the sequence, e.g.
+        #   {'id1': 'id2', 'id2': 'id3'}   <-- id3 is the last one
+        #   {}                             <-- zero or one ids, no next turn
+        self.turns = dict(zip(ids, ids[1:]))
+        # mapping of id to the event that signals that it is this id's turn
+        self.events = {id: asyncio.Event() for id in ids}
+        if ids:
+            # the first id can go immediately
+            self.events[ids[0]].set()
+
+    async def wait_for(self, id: str | None) -> None:
+        """Wait until it is the turn of the given function call ID."""
+        event = self.events.get(id) if id else None
+        if event is None:
+            # Not part of the model response (e.g. injected by another callback)
+            return
+        await event.wait()
+
+    def allow_next_after(self, id: str | None) -> None:
+        """Let the function call that comes after the given ID go."""
+        next_id = self.turns.get(id) if id else None
+        if next_id is not None:
+            self.events[next_id].set()
+
+    def release_all(self) -> None:
+        """Let every waiting function call go, e.g. when the invocation is finished."""
+        for event in self.events.values():
+            event.set()
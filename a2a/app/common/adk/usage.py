@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import restate
+from google.genai.types import GenerateContentResponseUsageMetadata
+from pydantic import BaseModel, Field
+
+# The state key of the usage ledger, in the virtual object of the session
+USAGE_LEDGER_KEY = "usage"
+
+# The ledger keeps the usage of the most recent invocations, and the totals of all of them
+MAX_LEDGER_INVOCATIONS = 50
+
+
+@dataclass(frozen=True)
+class ModelPrice:
+    """Price of a model, in USD per million tokens."""
+
+    input: float
+    output: float
+    # price of prompt tokens read from the context cache, if different from the input price
+    cached_input: Optional[float] = None
+
+
+class TokenUsage(BaseModel):
+    """Token counts (and the cost, if the price of the model is known) of one or more model calls."""
+
+    model_calls: int = 0
+    prompt_tokens: int = 0
+    candidates_tokens: int = 0
+    thoughts_tokens: int = 0
+    cached_tokens: int = 0
+    tool_use_prompt_tokens: int = 0
+    total_tokens: int = 0
+    cost: float = 0.0
+
+    @classmethod
+    def from_metadata(
+        cls, usage: Optional[GenerateContentResponseUsageMetadata], price: Optional[ModelPrice] = None
+    ) -> "TokenUsage":
+        """The usage of a single model call, as reported in the usage_metadata of the response."""
+        if usage is None:
+            return cls(model_calls=1)
+        prompt = usage.prompt_token_count or 0
+        candidates = usage.candidates_token_count or 0
+        thoughts = usage.thoughts_token_count or 0
+        cached = usage.cached_content_token_count or 0
+        tool_use_prompt = usage.tool_use_prompt_token_count or 0
+        cost = 0.0
+        if price is not None:
+            cached_price = price.cached_input if price.cached_input is not None else price.input
+            cost = (
+                (prompt - cached + tool_use_prompt) * price.input
+                + cached * cached_price
+                + (candidates + thoughts) * price.output
+            ) / 1e6
+        return cls(
+            model_calls=1,
+            prompt_tokens=prompt,
+            candidates_tokens=candidates,
+            thoughts_tokens=thoughts,
+            cached_tokens=cached,
+            tool_use_prompt_tokens=tool_use_prompt,
+            total_tokens=usage.total_token_count or prompt + tool_use_prompt + candidates + thoughts,
+            cost=cost,
+        )
+
+    def add(self, other: "TokenUsage") -> None:
+        self.model_calls += other.model_calls
+        self.prompt_tokens += other.prompt_tokens
+        self.candidates_tokens += other.candidates_tokens
+        self.thoughts_tokens += other.thoughts_tokens
+        self.cached_tokens += other.cached_tokens
+        self.tool_use_prompt_tokens += other.tool_use_prompt_tokens
+        self.total_tokens += other.total_tokens
+        self.cost += other.cost
+
+
+class InvocationUsage(BaseModel):
+    """Token usage of one agent invocation, per agent."""
+
+    invocation_id: str
+    total: TokenUsage = Field(default_factory=TokenUsage)
+    agents: dict[str, TokenUsage] = Field(default_factory=dict)
+
+    def add(self, agent_name: str, usage: TokenUsage) -> None:
+        self.total.add(usage)
+        self.agents.setdefault(agent_name, TokenUsage()).add(usage)
+
+
+class UsageLedger(BaseModel):
+    """Token usage of a session, stored in the state of the session's virtual object."""
+
+    total: TokenUsage = Field(default_factory=TokenUsage)
+    agents: dict[str, TokenUsage] = Field(default_factory=dict)
+    # most recent last
+    invocations: list[InvocationUsage] = Field(default_factory=list)
+
+    def add(self, invocation: InvocationUsage) -> None:
+        self.total.add(invocation.total)
+        for agent_name, usage in invocation.agents.items():
+            self.agents.setdefault(agent_name, TokenUsage()).add(usage)
+        self.invocations.append(invocation)
+        del self.invocations[:-MAX_LEDGER_INVOCATIONS]
+
+
+async def get_usage_ledger(ctx: restate.ObjectSharedContext) -> UsageLedger:
+    """Get the usage ledger of the session, e.g. from a shared handler of the agent's virtual object."""
+    return await ctx.get(USAGE_LEDGER_KEY, type_hint=UsageLedger) or UsageLedger()
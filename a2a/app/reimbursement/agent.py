@@ -11,7 +11,9 @@ from google.genai.types import Content, Part
 from app.common.a2a.models import A2AAgent, AgentInvokeResult
 from app.common.adk.restate_plugin import RestatePlugin
 from app.common.adk.restate_session_service import RestateSessionService
+from app.common.adk.session_compaction import SessionCompactionPlugin
 from app.common.adk.restate_utils import restate_overrides
+from app.common.adk.usage import UsageLedger, get_usage_ledger
 from app.reimbursement.prompt import PROMPT
 from app.reimbursement.utils import Reimbursement, backoffice_submit_request, \
     backoffice_email_employee, end_of_month, handle_payment
@@ -95,7 +97,7 @@ agent = Agent(
     instruction=PROMPT,
     tools=[create_request_form, reimburse, return_form],
 )
-app = App(name=APP_NAME, root_agent=agent, plugins=[RestatePlugin()])
+app = App(name=APP_NAME, root_agent=agent, plugins=[RestatePlugin(usage_ledger=True), SessionCompactionPlugin()])
 session_service = RestateSessionService()
 
 reimbursement_service = restate.VirtualObject("ReimbursementService")
@@ -132,6 +134,12 @@ async def invoke(ctx: restate.ObjectContext, query: str) -> AgentInvokeResult:
         )
 
 
+@reimbursement_service.handler(kind="shared")
+async def get_usage(ctx: restate.ObjectSharedContext) -> UsageLedger:
+    """Token usage of this session, per agent and for the most recent invocations."""
+    return await get_usage_ledger(ctx)
+
+
 class ReimbursementAgent(A2AAgent):
     async def invoke(
         self, restate_context: restate.ObjectContext, query: str, session_id: str
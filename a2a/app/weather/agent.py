@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 import restate
 
 from google.adk import Runner
@@ -5,20 +7,23 @@ from google.adk.agents.llm_agent import Agent
 from google.adk.apps import App
 from google.genai.types import Content, Part
 
+from app.common.adk.durable_tools import durable_tool
 from app.common.adk.restate_plugin import RestatePlugin
 from app.common.adk.restate_session_service import RestateSessionService
+from app.common.adk.session_compaction import SessionCompactionPlugin
 from app.common.adk.restate_utils import restate_overrides
+from app.common.adk.usage import UsageLedger, get_usage_ledger
 from app.weather.utils import WeatherResponse, WeatherPrompt
 from app.weather.utils import fetch_weather
-from google.adk.tools.tool_context import ToolContext
 from app.common.a2a.models import A2AAgent, AgentInvokeResult
 
 APP_NAME = "agents"
 
-async def get_weather(tool_context: ToolContext, city: str) -> WeatherResponse:
+# The plugin runs the tool as a durable step, and reuses recent results for the same city
+@durable_tool(pure=True, ttl=timedelta(minutes=10))
+async def get_weather(city: str) -> WeatherResponse:
     """Get the current weather for a given city."""
-    restate_context = tool_context.session.state["restate_context"]
-    return await restate_context.run_typed("Get weather", fetch_weather, city=city)
+    return await fetch_weather(city)
 
 agent = Agent(
     model="gemini-2.5-flash",
@@ -29,7 +34,16 @@ agent = Agent(
     tools=[get_weather],
 )
 
-app = App(name=APP_NAME, root_agent=agent, plugins=[RestatePlugin()])
+# get_weather is a single durable step, so the lookups for multiple cities can run concurrently
+app = App(
+    name=APP_NAME,
+    root_agent=agent,
+    plugins=[
+        RestatePlugin(parallel_tool_calls=True, usage_ledger=True),
+        # weather answers are short-lived, keep less of them verbatim
+        SessionCompactionPlugin(token_budget=4_000, keep_recent_invocations=1),
+    ],
+)
 session_service = RestateSessionService()
 
 agent_service = restate.VirtualObject("WeatherAgent")
@@ -55,6 +69,12 @@ async def run(ctx: restate.ObjectContext, prompt: WeatherPrompt) -> str:
                     final_response = event.content.parts[0].text
         return final_response
 
+@agent_service.handler(kind="shared")
+async def get_usage(ctx: restate.ObjectSharedContext) -> UsageLedger:
+    """Token usage of this session, per agent and for the most recent invocations."""
+    return await get_usage_ledger(ctx)
+
+
 class ADKWeatherAgent(A2AAgent):
     async def invoke(
         self, restate_context: restate.ObjectContext, query: str, session_id: str
@@ -35,7 +35,9 @@ def fail_on_denver(city):
 
 async def call_weather_api(city):
     try:
-        resp = httpx.get(f"https://wttr.in/{httpx.URL(city)}?format=j1", timeout=10.0)
+        # Use the async client so that concurrent tool calls don't block each other
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            resp = await client.get(f"https://wttr.in/{httpx.URL(city)}?format=j1")
         resp.raise_for_status()
 
         if resp.text.startswith("Unknown location"):
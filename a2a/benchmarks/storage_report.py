@@ -0,0 +1,290 @@
+"""Journal and state size of ADK sessions that run through the RestatePlugin and RestateSessionService.
+
+Runs a sample conversation with a stubbed model, one Restate invocation per turn, and reports
+for every turn: the journal entries and their bytes per entry type (persist event, call LLM,
+call tool, state reads and writes), and the size of every state key of the session's virtual
+object after the turn. Values are serialized with the same serdes as in a real deployment.
+
+Save a report with --json and pass it as --baseline in CI: the run fails if the journal bytes
+of a turn or the state size grows by more than the tolerance.
+
+With --compaction-budget, the session is compacted by the SessionCompactionPlugin, and the
+report shows on which turns. --answer-chars sets the length of the answers, e.g. 200 for
+the short answers of the weather agent.
+
+Usage:
+    uv run python -m benchmarks.storage_report [--turns 20] [--json report.json]
+                                                [--baseline report.json] [--tolerance 0.1]
+                                                [--compaction-budget 4000] [--keep-recent-invocations 1]
+                                                [--answer-chars 600]
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import re
+import sys
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Any, Optional, cast
+
+import restate
+from google.adk.agents import LlmAgent
+from google.adk.apps import App
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.plugins import BasePlugin
+from google.adk.runners import Runner
+from google.genai.types import Content, GenerateContentResponseUsageMetadata, Part
+from restate.serde import DefaultSerde, Serde
+from restate.types import extract_core_type
+
+from app.common.adk.durable_tools import durable_tool
+from app.common.adk.restate_plugin import RestatePlugin
+from app.common.adk.restate_session_service import RestateSessionService
+from app.common.adk.restate_utils import restate_overrides
+from app.common.adk.session_compaction import SessionCompactionPlugin
+
+APP_NAME = "storage_report"
+
+SESSION_ID = "session"
+
+
+@dataclass
+class JournalEntry:
+    kind: str
+    bytes: int
+
+
+@dataclass
+class TurnReport:
+    turn: int
+    entries: int
+    journal_bytes: int
+    # per entry kind: [entries, bytes]
+    journal: dict[str, list[int]]
+    # per state key, with the numbered keys of the same prefix summed up (e.g. session_archive::*)
+    state: dict[str, int]
+    state_bytes: int
+
+
+class _Request:
+    """The part of restate.Request that the plugin uses."""
+
+    def __init__(self, invocation_id: str):
+        self.id = invocation_id
+        self.attempt_finished_event = asyncio.Event()
+
+
+class RecordingContext:
+    """A stand-in for the restate.ObjectContext of one invocation, which records the journal it would write.
+
+    Steps run right away. Their results and the state values go through the same serde
+    as in the SDK, so the recorded sizes are those that Restate stores.
+    """
+
+    def __init__(self, invocation_id: str, key: str, state: dict[str, bytes]):
+        self._request = _Request(invocation_id)
+        self._key = key
+        self.state = state
+        self.journal: list[JournalEntry] = []
+
+    def key(self) -> str:
+        return self._key
+
+    def request(self) -> _Request:
+        return self._request
+
+    def run_typed(self, name: str, action, options: restate.RunOptions = restate.RunOptions(), /, *args, **kwargs):
+        serde = options.serde
+        if isinstance(serde, DefaultSerde):
+            type_hint = options.type_hint
+            if type_hint is None:
+                type_hint = inspect.signature(action, eval_str=True).return_annotation
+            serde = serde.with_maybe_type(extract_core_type(type_hint)[1])
+        # "call tool get_weather" and "call tool lookup_order" are the same kind of entry
+        kind = "call tool" if name.startswith("call tool ") else name
+
+        async def run() -> Any:
+            result = action(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await result
+            buffer = serde.serialize(result)
+            self.journal.append(JournalEntry(kind, len(buffer)))
+            # Return what a replay would see
+            return serde.deserialize(buffer)
+
+        return run()
+
+    async def get(self, name: str, serde: Serde = DefaultSerde(), type_hint: Optional[type] = None) -> Any:
+        buffer = self.state.get(name)
+        self.journal.append(JournalEntry("get state", len(buffer or b"")))
+        if buffer is None:
+            return None
+        if isinstance(serde, DefaultSerde):
+            serde = serde.with_maybe_type(type_hint)
+        return serde.deserialize(buffer)
+
+    def set(self, name: str, value: Any, serde: Serde = DefaultSerde()) -> None:
+        if isinstance(serde, DefaultSerde):
+            serde = serde.with_maybe_type(type(value))
+        buffer = serde.serialize(value)
+        self.journal.append(JournalEntry("set state", len(buffer)))
+        self.state[name] = buffer
+
+    def clear(self, name: str) -> None:
+        self.journal.append(JournalEntry("clear state", 0))
+        self.state.pop(name, None)
+
+    async def state_keys(self) -> list[str]:
+        self.journal.append(JournalEntry("get state keys", 0))
+        return list(self.state.keys())
+
+
+class StubModel(BaseLlm):
+    """Answers without calling an API.
+
+    A user message gets a call of the first tool, a tool result gets a text answer of
+    `answer_chars` characters. The usage metadata counts 4 characters per token.
+    """
+
+    model: str = "stub"
+    answer_chars: int = 600
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        prompt_chars = sum(len(part.text or "") for content in llm_request.contents for part in content.parts or [])
+        last = llm_request.contents[-1] if llm_request.contents else None
+        if llm_request.tools_dict and last and any(part.text for part in last.parts or []):
+            tool = next(iter(llm_request.tools_dict))
+            part = Part.from_function_call(name=tool, args={"order_id": f"order-{len(llm_request.contents)}"})
+            output_chars = 40
+        else:
+            part = Part.from_text(text=("The order is on its way. " * self.answer_chars)[:self.answer_chars])
+            output_chars = self.answer_chars
+        yield LlmResponse(
+            content=Content(role="model", parts=[part]),
+            usage_metadata=GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // 4,
+                candidates_token_count=output_chars // 4,
+                total_token_count=(prompt_chars + output_chars) // 4,
+            ),
+        )
+
+
+@durable_tool
+async def lookup_order(order_id: str) -> dict:
+    """Look up the status of an order."""
+    return {"order_id": order_id, "status": "shipped", "items": [{"sku": "A-100", "quantity": 2}]}
+
+
+def sample_app(compaction_budget: Optional[int], keep_recent_invocations: int, answer_chars: int) -> App:
+    agent = LlmAgent(
+        model=StubModel(answer_chars=answer_chars),
+        name="order_agent",
+        instruction="You answer questions about orders. Use the lookup_order tool.",
+        tools=[lookup_order],
+    )
+    plugins: list[BasePlugin] = [RestatePlugin(usage_ledger=True)]
+    if compaction_budget is not None:
+        plugins.append(
+            SessionCompactionPlugin(token_budget=compaction_budget, keep_recent_invocations=keep_recent_invocations)
+        )
+    return App(name=APP_NAME, root_agent=agent, plugins=plugins)
+
+
+async def run_conversation(
+        turns: int,
+        compaction_budget: Optional[int] = None,
+        keep_recent_invocations: int = 2,
+        answer_chars: int = 600,
+) -> list[TurnReport]:
+    app = sample_app(compaction_budget, keep_recent_invocations, answer_chars)
+    session_service = RestateSessionService()
+    runner = Runner(app=app, session_service=session_service)
+    state: dict[str, bytes] = {}
+    reports = []
+    for turn in range(1, turns + 1):
+        ctx = RecordingContext(f"inv-{turn}", SESSION_ID, state)
+        # RecordingContext implements the part of restate.Context that the plugin and session service use
+        with restate_overrides(cast(restate.Context, ctx)):
+            await session_service.create_session(app_name=APP_NAME, user_id="user", session_id=SESSION_ID)
+            message = Content(role="user", parts=[Part.from_text(text=f"Where is my order number {turn}?")])
+            async for _ in runner.run_async(user_id="user", session_id=SESSION_ID, new_message=message):
+                pass
+        ctx.request().attempt_finished_event.set()
+        reports.append(turn_report(turn, ctx))
+    await runner.close()
+    return reports
+
+
+def turn_report(turn: int, ctx: RecordingContext) -> TurnReport:
+    journal: dict[str, list[int]] = defaultdict(lambda: [0, 0])
+    for entry in ctx.journal:
+        journal[entry.kind][0] += 1
+        journal[entry.kind][1] += entry.bytes
+    state: dict[str, int] = defaultdict(int)
+    for key, buffer in ctx.state.items():
+        state[re.sub(r"::\d+$", "::*", key)] += len(buffer)
+    return TurnReport(
+        turn=turn,
+        entries=len(ctx.journal),
+        journal_bytes=sum(entry.bytes for entry in ctx.journal),
+        journal=dict(journal),
+        state=dict(state),
+        state_bytes=sum(state.values()),
+    )
+
+
+def print_reports(reports: list[TurnReport]) -> None:
+    kinds = sorted({kind for report in reports for kind in report.journal})
+    keys = sorted({key for report in reports for key in report.state})
+    print(f"{'turn':>4} {'entries':>7} {'journal B':>9} | " + " ".join(f"{kind:>16}" for kind in kinds)
+          + " | " + " ".join(f"{key:>16}" for key in keys) + f" {'state B':>9}")
+    for report in reports:
+        journal = " ".join(f"{'%d x %d' % tuple(report.journal.get(kind, [0, 0])):>16}" for kind in kinds)
+        state = " ".join(f"{report.state.get(key, 0):>16}" for key in keys)
+        print(f"{report.turn:>4} {report.entries:>7} {report.journal_bytes:>9} | {journal} | {state} {report.state_bytes:>9}")
+
+
+def regressions(reports: list[TurnReport], baseline: list[dict], tolerance: float) -> list[str]:
+    """Turns whose journal or state is larger than in the baseline by more than the tolerance."""
+    found = []
+    for report, expected in zip(reports, baseline):
+        for metric in ("entries", "journal_bytes", "state_bytes"):
+            limit = expected[metric] * (1 + tolerance)
+            if getattr(report, metric) > limit:
+                found.append(f"turn {report.turn}: {metric} {getattr(report, metric)} > {expected[metric]} (+{tolerance:.0%})")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--compaction-budget", type=int, help="Add the SessionCompactionPlugin with this token budget")
+    parser.add_argument("--keep-recent-invocations", type=int, default=2)
+    parser.add_argument("--answer-chars", type=int, default=600)
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--baseline", help="Fail if a turn is larger than in this report")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    reports = asyncio.run(
+        run_conversation(args.turns, args.compaction_budget, args.keep_recent_invocations, args.answer_chars)
+    )
+    print_reports(reports)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([asdict(report) for report in reports], f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(reports, json.load(f), args.tolerance)
+        for line in found:
+            print(line, file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.common.adk.lockstep import Lockstep  # noqa: E402
+
+
+class LockstepTest(unittest.IsolatedAsyncioTestCase):
+    def has_turn(self, lockstep: Lockstep, branch: str) -> bool:
+        return lockstep.current == branch and lockstep.events[branch].is_set()
+
+    async def test_branches_take_turns_in_order(self):
+        lockstep = Lockstep("root")
+        lockstep.split("root", ["a", "b", "c"])
+        self.assertTrue(self.has_turn(lockstep, "a"))
+
+        lockstep.pass_turn("a")
+        self.assertTrue(self.has_turn(lockstep, "b"))
+        self.assertFalse(lockstep.events["a"].is_set())
+        lockstep.pass_turn("c")  # not its turn
+        self.assertTrue(self.has_turn(lockstep, "b"))
+        lockstep.pass_turn("b")
+        lockstep.pass_turn("c")
+        self.assertTrue(self.has_turn(lockstep, "a"))
+
+    async def test_wait_for_blocks_until_the_turn(self):
+        lockstep = Lockstep("root")
+        lockstep.split("root", ["a", "b"])
+        waiting = asyncio.create_task(lockstep.wait_for("b"))
+        await asyncio.sleep(0)
+        self.assertFalse(waiting.done())
+
+        lockstep.pass_turn("a")
+        await asyncio.wait_for(waiting, timeout=1)
+        # Unknown branches, e.g. outside a ParallelAgent, don't wait
+        await asyncio.wait_for(lockstep.wait_for("other"), timeout=1)
+
+    async def test_finished_branch_gives_the_turn_to_the_next(self):
+        lockstep = Lockstep("root")
+        lockstep.split("root", ["a", "b", "c"])
+        lockstep.pass_turn("a")
+        lockstep.finish("b")
+        self.assertEqual(lockstep.ring, ["a", "c"])
+        self.assertTrue(self.has_turn(lockstep, "c"))
+
+        # The last branch of the ring hands over to the first one
+        lockstep.finish("c")
+        self.assertTrue(self.has_turn(lockstep, "a"))
+
+    async def test_parent_gets_the_turn_back_after_its_sub_branches(self):
+        lockstep = Lockstep("root")
+        lockstep.split("root", ["a", "b"])
+        lockstep.split("a", ["a1", "a2"])
+        self.assertEqual(lockstep.ring, ["a1", "a2", "b"])
+        self.assertTrue(self.has_turn(lockstep, "a1"))
+
+        lockstep.finish("a1")
+        self.assertTrue(self.has_turn(lockstep, "a2"))
+        lockstep.finish("a2")
+        self.assertEqual(lockstep.ring, ["a", "b"])
+        self.assertTrue(self.has_turn(lockstep, "a"))
+
+        lockstep.finish("a")
+        lockstep.finish("b")
+        self.assertEqual(lockstep.ring, ["root"])
+        self.assertTrue(self.has_turn(lockstep, "root"))
+
+    async def test_release_all_lets_every_branch_go(self):
+        lockstep = Lockstep("root")
+        lockstep.split("root", ["a", "b", "c"])
+        waiting = [asyncio.create_task(lockstep.wait_for(branch)) for branch in ("b", "c")]
+        await asyncio.sleep(0)
+
+        lockstep.release_all()
+        await asyncio.wait_for(asyncio.gather(*waiting), timeout=1)
+        # Turns don't change anymore
+        lockstep.pass_turn("a")
+        self.assertEqual(lockstep.current, "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import email.utils
+import sys
+import time
+import unittest
+from pathlib import Path
+
+import httpx
+import restate
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.common.adk.model_retry import ModelErrorKind, classify_model_error, retry_after  # noqa: E402
+
+
+def status_error(code: int, headers: dict[str, str] | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.com/v1/models")
+    response = httpx.Response(code, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"Status {code}", request=request, response=response)
+
+
+class ProviderError(Exception):
+    """Like the google.genai APIError: a `code` and the decoded error body as `details`."""
+
+    def __init__(self, code: int, details: dict | None = None):
+        super().__init__(f"Status {code}")
+        self.code = code
+        self.details = details
+
+
+class ClassifyModelErrorTest(unittest.TestCase):
+    def test_by_status_code(self):
+        self.assertEqual(classify_model_error(status_error(429)), ModelErrorKind.RATE_LIMIT)
+        self.assertEqual(classify_model_error(status_error(503)), ModelErrorKind.TRANSIENT)
+        self.assertEqual(classify_model_error(status_error(529)), ModelErrorKind.TRANSIENT)
+        self.assertEqual(classify_model_error(status_error(408)), ModelErrorKind.TRANSIENT)
+        self.assertEqual(classify_model_error(status_error(401)), ModelErrorKind.TERMINAL)
+        self.assertEqual(classify_model_error(ProviderError(400)), ModelErrorKind.TERMINAL)
+        self.assertEqual(classify_model_error(ProviderError(429)), ModelErrorKind.RATE_LIMIT)
+
+    def test_without_status_code(self):
+        self.assertEqual(classify_model_error(httpx.ConnectError("Connection refused")), ModelErrorKind.TRANSIENT)
+        self.assertEqual(classify_model_error(TimeoutError()), ModelErrorKind.TRANSIENT)
+        self.assertEqual(classify_model_error(KeyError("output")), ModelErrorKind.UNKNOWN)
+        self.assertEqual(classify_model_error(restate.TerminalError("Cancelled")), ModelErrorKind.TERMINAL)
+
+
+class RetryAfterTest(unittest.TestCase):
+    def test_header_in_seconds(self):
+        self.assertEqual(retry_after(status_error(429, {"Retry-After": "7"})), 7.0)
+
+    def test_header_as_http_date(self):
+        date = email.utils.formatdate(time.time() + 30, usegmt=True)
+        delay = retry_after(status_error(429, {"Retry-After": date}))
+        assert delay is not None
+        self.assertAlmostEqual(delay, 30, delta=2)
+
+    def test_date_in_the_past(self):
+        date = email.utils.formatdate(time.time() - 30, usegmt=True)
+        self.assertEqual(retry_after(status_error(429, {"Retry-After": date})), 0.0)
+
+    def test_gemini_retry_info(self):
+        details = {
+            "error": {
+                "code": 429,
+                "details": [
+                    {"@type": "type.googleapis.com/google.rpc.QuotaFailure"},
+                    {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "12s"},
+                ],
+            }
+        }
+        self.assertEqual(retry_after(ProviderError(429, details)), 12.0)
+
+    def test_without_delay(self):
+        self.assertIsNone(retry_after(status_error(429)))
+        self.assertIsNone(retry_after(status_error(429, {"Retry-After": "soon"})))
+        self.assertIsNone(retry_after(ProviderError(429, {"error": {"code": 429}})))
+        self.assertIsNone(retry_after(TimeoutError()))
+
+
+if __name__ == "__main__":
+    unittest.main()
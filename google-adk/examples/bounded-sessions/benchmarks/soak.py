@@ -0,0 +1,134 @@
+"""Memory and throughput of the session service over many requests, without a model.
+
+Each request does what the agent service does with its session: it creates a new
+session, appends the events of a turn (the user message, a tool call and its result,
+the answer), and finishes. Prints the throughput and the peak RSS of the process
+every --report-every requests:
+
+    in-memory  the ADK's InMemorySessionService, which keeps every session
+    bounded    the BoundedInMemorySessionService, with request_session
+
+The peak RSS of the bounded service stays flat once the first sessions are deleted,
+the in-memory one grows with every request.
+
+Usage:
+    uv run benchmarks/soak.py [--service bounded] [--requests 1000000] [--report-every 100000]
+"""
+
+import argparse
+import asyncio
+import resource
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.genai.types import Content, FunctionCall, FunctionResponse, Part
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from session_service import BoundedInMemorySessionService  # noqa: E402
+
+APP_NAME = "agents"
+
+
+def turn(invocation_id: str) -> list[Event]:
+    """The events of one turn of the weather agent."""
+    return [
+        Event(
+            author="user",
+            invocation_id=invocation_id,
+            content=Content(role="user", parts=[Part.from_text(text="What is the weather like in San Francisco?")]),
+        ),
+        Event(
+            author="weather_agent",
+            invocation_id=invocation_id,
+            content=Content(
+                role="model",
+                parts=[Part(function_call=FunctionCall(name="get_weather", args={"city": "San Francisco"}))],
+            ),
+        ),
+        Event(
+            author="weather_agent",
+            invocation_id=invocation_id,
+            content=Content(
+                role="user",
+                parts=[
+                    Part(
+                        function_response=FunctionResponse(
+                            name="get_weather", response={"temperature": 23, "description": "Sunny and warm."}
+                        )
+                    )
+                ],
+            ),
+        ),
+        Event(
+            author="weather_agent",
+            invocation_id=invocation_id,
+            content=Content(role="model", parts=[Part.from_text(text="It is 23 degrees and sunny in San Francisco.")]),
+        ),
+    ]
+
+
+async def append_turn(service: InMemorySessionService, session: Session) -> None:
+    for event in turn(str(uuid.uuid4())):
+        await service.append_event(session, event)
+
+
+async def in_memory_request(service: InMemorySessionService, user_id: str) -> None:
+    session = await service.create_session(app_name=APP_NAME, user_id=user_id, session_id=str(uuid.uuid4()))
+    await append_turn(service, session)
+
+
+async def bounded_request(service: BoundedInMemorySessionService, user_id: str) -> None:
+    async with service.request_session(app_name=APP_NAME, user_id=user_id, session_id=str(uuid.uuid4())) as session:
+        await append_turn(service, session)
+
+
+def peak_rss_mib() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB on Linux, bytes on macOS
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+async def soak(service_name: str, requests: int, report_every: int, users: int) -> None:
+    if service_name == "bounded":
+        bounded = BoundedInMemorySessionService()
+
+        async def request(user_id: str) -> None:
+            await bounded_request(bounded, user_id)
+
+        sessions = bounded.__len__
+    else:
+        in_memory = InMemorySessionService()
+
+        async def request(user_id: str) -> None:
+            await in_memory_request(in_memory, user_id)
+
+        def sessions() -> int:
+            return sum(len(s) for app in in_memory.sessions.values() for s in app.values())
+
+    print(f"{'requests':>9} {'req/s':>7} {'peak RSS MiB':>12} {'live sessions':>13}")
+    start = time.perf_counter()
+    for i in range(1, requests + 1):
+        await request(f"user-{i % users}")
+        if i % report_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"{i:>9} {report_every / elapsed:>7.0f} {peak_rss_mib():>12.0f} {sessions():>13}")
+            start = time.perf_counter()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--service", choices=["bounded", "in-memory"], default="bounded")
+    parser.add_argument("--requests", type=int, default=1_000_000)
+    parser.add_argument("--report-every", type=int, default=100_000)
+    parser.add_argument("--users", type=int, default=1_000, help="Number of distinct user IDs")
+    args = parser.parse_args()
+    asyncio.run(soak(args.service, args.requests, args.report_every, args.users))
+
+
+if __name__ == "__main__":
+    main()
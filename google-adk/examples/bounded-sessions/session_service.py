@@ -0,0 +1,150 @@
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, AsyncIterator, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from opentelemetry import metrics
+
+meter = metrics.get_meter("bounded_sessions.session_service")
+
+session_evictions = meter.create_counter(
+    "adk.sessions.evictions",
+    description="Sessions evicted from memory, by reason (ttl/size).",
+)
+
+SessionKey = tuple[str, str, str]
+
+_services: "weakref.WeakSet[BoundedInMemorySessionService]" = weakref.WeakSet()
+
+meter.create_observable_gauge(
+    "adk.sessions.live",
+    callbacks=[lambda options: [metrics.Observation(sum(len(s) for s in _services))]],
+    description="Sessions held in memory.",
+)
+meter.create_observable_gauge(
+    "adk.sessions.events",
+    callbacks=[lambda options: [metrics.Observation(sum(s.event_count() for s in _services))]],
+    description="Events of all sessions held in memory.",
+)
+
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    """An InMemorySessionService with an upper bound on the memory it holds.
+
+    It keeps at most `max_sessions` sessions. When a new session would exceed that,
+    the least recently used one is evicted. Sessions that were not used for `ttl` are
+    evicted as well. Use `request_session` to delete the session of a request as soon
+    as the request is done; the bounds only catch the sessions that are left behind.
+
+    With Restate, the session of a request can be rebuilt at any time: the model calls
+    and tool steps are journaled, so a retried request replays them into a new session.
+    """
+
+    def __init__(self, *, max_sessions: int = 10_000, ttl: timedelta = timedelta(minutes=10)):
+        super().__init__()
+        self._max_sessions = max_sessions
+        self._ttl = ttl.total_seconds()
+        # least recently used first, with the time of the last use
+        self._last_used: OrderedDict[SessionKey, float] = OrderedDict()
+        _services.add(self)
+
+    def __len__(self) -> int:
+        return len(self._last_used)
+
+    def event_count(self) -> int:
+        return sum(
+            len(session.events)
+            for users in self.sessions.values()
+            for sessions in users.values()
+            for session in sessions.values()
+        )
+
+    @asynccontextmanager
+    async def request_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> AsyncIterator[Session]:
+        """Get or create the session of one request, and delete it when the request is done."""
+        session = await self.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        ) or await self.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+        try:
+            yield session
+        finally:
+            await self.delete_session(
+                app_name=app_name, user_id=user_id, session_id=session_id
+            )
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._used((app_name, user_id, session.id))
+        await self._evict()
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        await self._evict()
+        session = await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            self._used((app_name, user_id, session_id))
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        self._forget((app_name, user_id, session_id))
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        key = (session.app_name, session.user_id, session.id)
+        if key in self._last_used:
+            self._used(key)
+        return event
+
+    def _used(self, key: SessionKey) -> None:
+        self._last_used[key] = time.monotonic()
+        self._last_used.move_to_end(key)
+
+    async def _evict(self) -> None:
+        expired_before = time.monotonic() - self._ttl
+        while self._last_used:
+            key, last_used = next(iter(self._last_used.items()))
+            if last_used < expired_before:
+                reason = "ttl"
+            elif len(self._last_used) > self._max_sessions:
+                reason = "size"
+            else:
+                return
+            app_name, user_id, session_id = key
+            await self.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            session_evictions.add(1, {"reason": reason})
+
+    def _forget(self, key: SessionKey) -> None:
+        self._last_used.pop(key, None)
+        app_name, user_id, _ = key
+        # InMemorySessionService keeps an empty dict per user after deleting their last session
+        users = self.sessions.get(app_name, {})
+        if user_id in users and not users[user_id]:
+            del users[user_id]
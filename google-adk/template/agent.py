@@ -62,8 +62,14 @@ async def run(ctx: restate.Context, req: WeatherPrompt) -> str | None:
     )
 
     final_response = None
-    async for event in events:
-        if event.is_final_response() and event.content and event.content.parts:
-            if event.content.parts[0].text:
-                final_response = event.content.parts[0].text
+    try:
+        async for event in events:
+            if event.is_final_response() and event.content and event.content.parts:
+                if event.content.parts[0].text:
+                    final_response = event.content.parts[0].text
+    finally:
+        # The session is only used for this request, don't keep it in memory
+        await session_service.delete_session(
+            app_name=APP_NAME, user_id=req.user_id, session_id=session_id
+        )
     return final_response
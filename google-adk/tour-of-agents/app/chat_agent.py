@@ -3,8 +3,9 @@ from google.adk import Runner
 from google.adk.apps import App
 from google.genai.types import Content, Part
 from google.adk.agents.llm_agent import Agent
-from restate.ext.adk import RestateSessionService, RestatePlugin
-from utils.models import ChatMessage
+from restate.ext.adk import RestatePlugin
+from utils.history import PagedSessionService, read_history_page
+from utils.models import ChatMessage, HistoryPage, HistoryRequest
 from utils.utils import parse_agent_response
 
 APP_NAME = "agents"
@@ -16,7 +17,8 @@ agent = Agent(
     instruction="You are a helpful assistant. Be concise and helpful.",
 )
 app = App(name=APP_NAME, root_agent=agent, plugins=[RestatePlugin()])
-runner = Runner(app=app, session_service=RestateSessionService())
+# Stores the session events in pages as well, for get_history_page
+runner = Runner(app=app, session_service=PagedSessionService())
 
 chat = restate.VirtualObject("Chat")
 
@@ -38,6 +40,13 @@ async def get_history(ctx: restate.ObjectSharedContext, session_id: str):
 
 # <end_here>
 
+
+@chat.handler(kind="shared")
+async def get_history_page(ctx: restate.ObjectSharedContext, req: HistoryRequest) -> HistoryPage:
+    # One page of the session events, from the most recent one backwards, see HistoryRequest
+    return await read_history_page(ctx, req)
+
+
 if __name__ == "__main__":
     import hypercorn
     import asyncio
@@ -14,6 +14,7 @@ from utils.utils import (
     compare_to_standard_rates,
     check_fraud,
     parse_agent_response,
+    print_progress,
 )
 
 APP_NAME = "agents"
@@ -60,7 +61,8 @@ async def run(ctx: restate.ObjectContext, claim: InsuranceClaim) -> str | None:
         session_id=claim.session_id,
         new_message=Content(role="user", parts=[Part.from_text(text=prompt)]),
     )
-    return await parse_agent_response(events)
+    # Prints the tool calls while the agent runs
+    return await parse_agent_response(events, on_event=print_progress)
 
 
 if __name__ == "__main__":
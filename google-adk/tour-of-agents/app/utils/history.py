@@ -0,0 +1,122 @@
+from typing import Optional
+
+import restate
+from google.adk.events import Event
+from google.adk.sessions import Session
+from pydantic import BaseModel
+from restate.ext.adk import RestateSessionService
+
+from utils.models import HistoryPage, HistoryRequest
+
+# Events per stored page of the history
+PAGE_SIZE = 50
+
+
+class HistoryHeader(BaseModel):
+    """The version of the history of a session: enough to answer a request with an unchanged ETag."""
+
+    count: int = 0
+    last_update_time: float = 0.0
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.count}-{self.last_update_time}"'
+
+
+class HistorySegment(BaseModel):
+    events: list[Event]
+
+
+class HistoryUpdate(BaseModel):
+    header: HistoryHeader
+    # index of the first event that is stored again, at the start of a page
+    start: int
+    events: list[Event]
+
+
+def _header_key(session_id: str) -> str:
+    return f"session_history::{session_id}"
+
+
+def _page_key(session_id: str, page: int) -> str:
+    return f"session_history::{session_id}::{page}"
+
+
+class PagedSessionService(RestateSessionService):
+    """A RestateSessionService that also stores the events of each session in pages.
+
+    The RestateSessionService stores a session as one state entry, which a history request
+    would have to load as a whole. This keeps a copy of the events in pages of PAGE_SIZE,
+    and a small header with the number of events and the time of the last update. A
+    request with an unchanged ETag only reads the header, and a page of the history only
+    the pages it covers. Events are only appended, so a flush only writes the last page
+    and the new ones.
+    """
+
+    async def flush_session_state(self, session: Session):
+        await super().flush_session_state(session)
+        ctx = self.ctx()
+        header = await ctx.get(_header_key(session.id), type_hint=HistoryHeader) or HistoryHeader()
+
+        def changes() -> HistoryUpdate:
+            # A session that was deleted and created again starts over
+            start = header.count // PAGE_SIZE * PAGE_SIZE if header.count <= len(session.events) else 0
+            return HistoryUpdate(
+                header=HistoryHeader(count=len(session.events), last_update_time=session.last_update_time),
+                start=start,
+                events=session.events[start:],
+            )
+
+        # Journaled like the session, so that replays store the same events
+        update = await ctx.run_typed("store history", changes)
+        for offset in range(0, len(update.events), PAGE_SIZE):
+            page = (update.start + offset) // PAGE_SIZE
+            ctx.set(_page_key(session.id, page), HistorySegment(events=update.events[offset:offset + PAGE_SIZE]))
+        ctx.set(_header_key(session.id), update.header)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        ctx = self.ctx()
+        header = await ctx.get(_header_key(session_id), type_hint=HistoryHeader)
+        if header is None:
+            return
+        for page in range((header.count + PAGE_SIZE - 1) // PAGE_SIZE):
+            ctx.clear(_page_key(session_id, page))
+        ctx.clear(_header_key(session_id))
+
+
+async def read_history_page(ctx: restate.ObjectSharedContext, req: HistoryRequest) -> HistoryPage:
+    """Read one page of the events of the session, as stored by the PagedSessionService.
+
+    Events are only appended to a session, so the number of events and the time of the
+    last update identify its version, and serve as ETag.
+    """
+    header = await ctx.get(_header_key(req.session_id), type_hint=HistoryHeader)
+    if header is None:
+        return await _read_history_page_of_session(ctx, req)
+    if req.before is None and req.etag == header.etag:
+        return HistoryPage(etag=header.etag, not_modified=True)
+
+    end = header.count if req.before is None else min(req.before, header.count)
+    start = max(0, end - req.limit)
+    first_page = start // PAGE_SIZE
+    events: list[Event] = []
+    for page in range(first_page, (end + PAGE_SIZE - 1) // PAGE_SIZE):
+        segment = await ctx.get(_page_key(req.session_id, page), type_hint=HistorySegment)
+        events += segment.events if segment else []
+    offset = first_page * PAGE_SIZE
+    return HistoryPage(events=events[start - offset:end - offset], next_cursor=start or None, etag=header.etag)
+
+
+async def _read_history_page_of_session(ctx: restate.ObjectSharedContext, req: HistoryRequest) -> HistoryPage:
+    """A page of a session that was stored without pages, from the session itself."""
+    session: Optional[Session] = await ctx.get(f"session_store::{req.session_id}", type_hint=Session)
+    if session is None:
+        return HistoryPage(etag='"0"')
+    header = HistoryHeader(count=len(session.events), last_update_time=session.last_update_time)
+    if req.before is None and req.etag == header.etag:
+        return HistoryPage(etag=header.etag, not_modified=True)
+
+    end = header.count if req.before is None else min(req.before, header.count)
+    start = max(0, end - req.limit)
+    return HistoryPage(events=session.events[start:end], next_cursor=start or None, etag=header.etag)
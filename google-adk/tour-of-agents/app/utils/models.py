@@ -2,7 +2,8 @@ from typing import Optional, Dict, Any
 
 from pydantic.alias_generators import to_camel as camelize
 
-from pydantic import BaseModel, ConfigDict
+from google.adk.events import Event
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # Prompts for AI agents (with default messages)
@@ -21,6 +22,27 @@ class ChatMessage(BaseModel):
     message: str = "Make a poem about durable execution."
 
 
+class HistoryRequest(BaseModel):
+    """A page of the chat history: the last `limit` events of the session before the cursor."""
+
+    session_id: str = "session-123"
+    limit: int = Field(default=20, ge=1, le=100)
+    # index of the oldest event of the previous page, None for the most recent events
+    before: Optional[int] = Field(default=None, ge=0)
+    # ETag of the history the client already has, to skip unchanged histories
+    etag: Optional[str] = None
+
+
+class HistoryPage(BaseModel):
+    # the session events of the page, oldest first. The first one has index next_cursor (or 0).
+    events: list[Event] = []
+    # pass as `before` to get the previous page, None if there are no older events
+    next_cursor: Optional[int] = None
+    etag: str
+    # True if the history didn't change since the given ETag, then events is empty
+    not_modified: bool = False
+
+
 class ClaimData(BaseModel):
     """Insurance claim data structure."""
 
@@ -3,21 +3,72 @@ from google.adk import Agent, Runner
 from google.adk.apps import App
 from google.adk.events import Event
 from google.genai.types import Content, Part
+from pydantic import BaseModel
 from restate.ext.adk import RestateSessionService, RestatePlugin
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Awaitable, Callable, Optional, TypeVar
 from utils.models import WeatherResponse, InsuranceClaim, WeatherRequest
 
 
-async def parse_agent_response(events: AsyncGenerator[Event, None]) -> str:
-    """Run an ADK agent and return the final text response."""
+M = TypeVar("M", bound=BaseModel)
+
+# Receives the events of an agent run that aren't its final response, as they arrive:
+# tool calls, tool results and, when streaming, partial text. E.g. to show progress in a UI.
+# It is called again when the handler is replayed, so it should not have side effects
+# that need to happen exactly once.
+EventSink = Callable[[Event], Awaitable[None]]
+
+
+async def parse_agent_response(
+    events: AsyncGenerator[Event, None], on_event: Optional[EventSink] = None
+) -> str:
+    """Run an ADK agent and return the final text response. The other events go to on_event."""
     final_response = ""
     async for event in events:
-        if event.is_final_response() and event.content and event.content.parts:
-            if event.content.parts[0].text:
-                final_response = event.content.parts[0].text
+        if on_event is not None and not event.is_final_response():
+            await on_event(event)
+        text = _final_text(event)
+        if text:
+            final_response = text
     return final_response
 
 
+async def parse_agent_output(
+    events: AsyncGenerator[Event, None],
+    output_key: str,
+    output_schema: type[M],
+    on_event: Optional[EventSink] = None,
+) -> M:
+    """Run an ADK agent with an output_schema and an output_key, and return its output as that model.
+
+    ADK parses the final response into the output_schema and stores it in the session
+    state under the output_key. This takes it from that state change, instead of
+    parsing the text of the response again. The other events go to on_event.
+    """
+    output = None
+    async for event in events:
+        if on_event is not None and not event.is_final_response():
+            await on_event(event)
+        if output_key in event.actions.state_delta:
+            output = event.actions.state_delta[output_key]
+    if output is None:
+        raise restate.TerminalError(f"The agent did not store an output under '{output_key}'.")
+    return output_schema.model_validate(output)
+
+
+def _final_text(event: Event) -> str:
+    if not event.is_final_response() or not event.content or not event.content.parts:
+        return ""
+    return "".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+async def print_progress(event: Event) -> None:
+    """An EventSink that prints the tool calls and results of an agent run."""
+    for call in event.get_function_calls():
+        print(f"🔧 {event.author} calls {call.name}({call.args})")
+    for response in event.get_function_responses():
+        print(f"✅ {response.name} returned {response.response}")
+
+
 # <start_weather>
 async def fetch_weather(req: WeatherRequest) -> WeatherResponse:
     fail_on_denver(req.city)
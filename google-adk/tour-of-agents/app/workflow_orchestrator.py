@@ -8,7 +8,7 @@ from google.genai.types import Content, Part
 from pydantic import BaseModel
 from restate.ext.adk import RestatePlugin, RestateSessionService
 
-from utils.utils import parse_agent_response
+from utils.utils import parse_agent_output, parse_agent_response
 
 
 class ReportRequest(BaseModel):
@@ -31,6 +31,7 @@ planner = Agent(
     name="research_planner",
     instruction="You are a research planner. Break the topic into 2-4 research sub-tasks.",
     output_schema=TaskList,
+    output_key="plan",
 )
 plan_app = App(name=APP_NAME, root_agent=planner, plugins=[RestatePlugin()])
 plan_runner = Runner(app=plan_app, session_service=RestateSessionService())
@@ -65,8 +66,7 @@ async def generate(ctx: restate.ObjectContext, req: ReportRequest) -> dict:
         session_id=session_id,
         new_message=Content(role="user", parts=[Part.from_text(text=req.topic)]),
     )
-    plan_output = await parse_agent_response(plan_events)
-    tasks = TaskList.model_validate_json(plan_output).tasks
+    tasks = (await parse_agent_output(plan_events, "plan", TaskList)).tasks
 
     # Step 2: Dispatch workers in parallel
     worker_promises = []
@@ -5,7 +5,7 @@ from google.adk.apps import App
 from google.genai.types import Content, Part
 from restate.ext.adk import RestatePlugin, RestateSessionService
 from utils.models import ClaimData, ClaimPrompt
-from utils.utils import parse_agent_response, convert_currency, process_payment
+from utils.utils import parse_agent_output, parse_agent_response, convert_currency, process_payment
 
 # <start_here>
 parse_agent = Agent(
@@ -13,6 +13,7 @@ parse_agent = Agent(
     name="document_parser",
     instruction="Extract the claim amount, currency, category, and description.",
     output_schema=ClaimData,
+    output_key="claim",
 )
 parse_app = App(name="claims", root_agent=parse_agent, plugins=[RestatePlugin()])
 parse_runner = Runner(app=parse_app, session_service=RestateSessionService())
@@ -20,7 +21,8 @@ parse_runner = Runner(app=parse_app, session_service=RestateSessionService())
 analysis_agent = Agent(
     model="gemini-2.5-flash",
     name="claims_analyst",
-    instruction="Assess whether this claim is valid and determine the approved amount.",
+    # The parsed claim, from the session state
+    instruction="Assess whether this claim is valid and determine the approved amount. Claim: {claim}",
 )
 analysis_app = App(name="claims", root_agent=analysis_agent, plugins=[RestatePlugin()])
 analysis_runner = Runner(app=analysis_app, session_service=RestateSessionService())
@@ -36,14 +38,13 @@ async def process(ctx: restate.ObjectContext, req: ClaimPrompt) -> dict:
         session_id=req.session_id,
         new_message=Content(role="user", parts=[Part.from_text(text=req.message)]),
     )
-    parsed = await parse_agent_response(parsing_events)
-    claim = ClaimData.model_validate_json(parsed)
+    claim = await parse_agent_output(parsing_events, "claim", ClaimData)
 
     # Step 2: Analyze the claim (LLM step)
     analysis_events = analysis_runner.run_async(
         user_id=ctx.key(),
         session_id=req.session_id,
-        new_message=Content(role="user", parts=[Part.from_text(text=parsed)]),
+        new_message=Content(role="user", parts=[Part.from_text(text="Assess the claim.")]),
     )
     analysis = await parse_agent_response(analysis_events)
 
@@ -0,0 +1,67 @@
+"""Import time and memory of every tour app.
+
+Each app is imported in a fresh interpreter, the same way `uv run app/<name>.py` does.
+The libraries that all apps share (ADK, Restate and its ADK integration) are imported
+first and reported separately, so that the app column shows what the module of the
+app itself costs at startup: its agents, runners and services.
+
+Usage:
+    uv run benchmarks/startup.py [--runs 5]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Prints the import times in seconds and the peak RSS in KiB (ru_maxrss is in bytes on macOS)
+MEASURE = """
+import resource, sys, time
+
+def rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+start = time.perf_counter()
+import google.adk, restate, restate.ext.adk
+libraries, libraries_rss = time.perf_counter() - start, rss()
+start = time.perf_counter()
+import {module}
+print(libraries, time.perf_counter() - start, libraries_rss, rss())
+"""
+
+
+def measure(module: str, runs: int) -> list[float]:
+    """Medians over the given number of runs of: library import ms, app import ms, library RSS MiB, total RSS MiB."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(module=module)],
+            cwd=APP_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        libraries, app, libraries_rss, total_rss = (float(value) for value in output)
+        samples.append((libraries * 1000, app * 1000, libraries_rss / 1024, total_rss / 1024))
+    return [statistics.median(column) for column in zip(*samples)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'app':<36} {'libraries ms':>12} {'app ms':>8} {'RSS MiB':>8} {'app MiB':>8}")
+    for app in sorted(APP_DIR.glob("*.py")):
+        if app.stem == "__init__":
+            continue
+        libraries, elapsed, libraries_rss, total_rss = measure(app.stem, args.runs)
+        print(f"{app.name:<36} {libraries:>12.0f} {elapsed:>8.1f} {total_rss:>8.1f} {total_rss - libraries_rss:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
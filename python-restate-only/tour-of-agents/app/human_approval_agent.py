@@ -9,7 +9,7 @@ import restate
 from pydantic import BaseModel
 from restate import RunOptions
 
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
 from util.util import InsuranceClaim, request_review, tool, ClaimPrompt
 
 
@@ -80,4 +80,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
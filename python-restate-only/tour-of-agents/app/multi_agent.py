@@ -12,7 +12,7 @@ import restate
 from restate import RunOptions
 from pydantic import BaseModel
 
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
 from util.util import tool
 
 
@@ -46,6 +46,7 @@ async def answer(ctx: restate.Context, question: Question) -> str | None:
         Choose the appropriate specialist, or respond directly if no specialist is needed. 
         {question.message}""",
         tools=[tool(name=name, description=desc) for name, desc in SPECIALISTS.items()],
+        route=True,
     )
 
     # 2. No specialist needed? Give a general answer
@@ -77,4 +78,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
@@ -8,7 +8,7 @@ import restate
 from pydantic import BaseModel
 from restate import Context, RunOptions
 
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
 from util.util import get_weather, WeatherRequest, tool, tool_result
 
 
@@ -40,7 +40,7 @@ async def run(ctx: Context, prompt: WeatherPrompt) -> str | None:
                 )
             ],
         )
-        messages.append(response)
+        messages.append(response.to_message())
 
         if not response.tool_calls:
             return response.content
@@ -73,4 +73,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
@@ -13,7 +13,7 @@ from pydantic import BaseModel
 from restate import RunOptions
 
 from util.util import tool, billing_agent_svc, account_agent_svc, product_agent_svc
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
 
 
 # Customer's question
@@ -42,6 +42,7 @@ async def answer(ctx: restate.Context, question: Question) -> str | None:
         RunOptions(max_attempts=3),
         messages=question.message,
         tools=[tool(name=name, description=desc) for name, desc in SPECIALISTS.items()],
+        route=True,
     )
 
     # 2. No specialist needed? Give a general answer
@@ -77,4 +78,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
@@ -0,0 +1,219 @@
+"""
+Batch lane for model calls that are not urgent
+
+Instead of calling the model right away, a step adds its request to the batch collector
+of the model (a Virtual Object), and waits on an awakeable. The collector submits the
+requests it collected as one job to the provider's Batch API, which is cheaper and has
+its own quota, and polls the job. When the job is done, it resolves the awakeable of
+every request with its answer. If the job or a request fails, the step falls back to
+a regular model call.
+
+Enable it with LLM_BATCH_LANE=1, and register the batch_collector service. For an
+offline setup, run the fake Batch API in util/fake_batch_api.py and set LLM_API_BASE.
+"""
+
+import io
+import json
+import os
+from datetime import timedelta
+from typing import Any
+
+import litellm
+import restate
+from litellm.types.utils import ModelResponse
+from litellm.utils import type_to_response_format_param
+from pydantic import BaseModel
+from restate import RunOptions
+
+from util.litellm_call import llm_call, llm_client
+from util.llm_result import LlmResult
+from util.scheduler import BACKGROUND
+
+BATCH_LANE = os.environ.get("LLM_BATCH_LANE", "0") == "1"
+# Submit after this many requests, or this long after the first request of a batch
+MAX_BATCH_SIZE = int(os.environ.get("LLM_BATCH_MAX_SIZE", 500))
+MAX_BATCH_WAIT = timedelta(seconds=float(os.environ.get("LLM_BATCH_MAX_WAIT", 60)))
+POLL_INTERVAL = timedelta(seconds=float(os.environ.get("LLM_BATCH_POLL_INTERVAL", 60)))
+
+
+class BatchRequest(BaseModel):
+    # also the custom_id of the request in the batch job
+    awakeable_id: str
+    messages: list[dict[str, Any]]
+    tools: list[dict[str, Any]] = []
+    response_format: dict[str, Any] | None = None
+
+
+class PendingRequests(BaseModel):
+    requests: list[BatchRequest] = []
+
+
+class BatchStatus(BaseModel):
+    status: str
+    output_file_id: str | None = None
+    error_file_id: str | None = None
+
+
+class BatchResults(BaseModel):
+    messages: dict[str, LlmResult] = {}
+    errors: dict[str, str] = {}
+
+
+async def batch_llm_call(
+    ctx: restate.Context,
+    name: str,
+    messages: str | list[dict[str, str]],
+    tools: list | None = None,
+    response_format: type[BaseModel] | None = None,
+) -> LlmResult:
+    """Call the model through the batch lane, if enabled. Otherwise, a regular durable llm_call step."""
+    model = llm_client.settings.model_for(name)
+    if not BATCH_LANE or litellm.get_llm_provider(model)[1] != "openai":
+        return await _call_now(ctx, name, messages, tools, response_format)
+
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    awakeable_id, answer = ctx.awakeable(type_hint=LlmResult)
+    request = BatchRequest(
+        awakeable_id=awakeable_id,
+        messages=messages,
+        tools=tools or [],
+        response_format=type_to_response_format_param(response_format),
+    )
+    ctx.object_send(add, key=model, arg=request)
+    try:
+        return await answer
+    except restate.TerminalError:
+        return await _call_now(ctx, name, messages, tools, response_format)
+
+
+async def _call_now(
+    ctx: restate.Context,
+    name: str,
+    messages: str | list[dict[str, str]],
+    tools: list | None,
+    response_format: type[BaseModel] | None,
+) -> LlmResult:
+    return await ctx.run_typed(
+        name,
+        llm_call,
+        RunOptions(max_attempts=3),
+        messages=messages,
+        tools=tools,
+        response_format=response_format,
+        step=name,
+        lane=BACKGROUND,
+    )
+
+
+# Keyed by model
+batch_collector = restate.VirtualObject("LlmBatchCollector")
+
+
+@batch_collector.handler()
+async def add(ctx: restate.ObjectContext, request: BatchRequest) -> None:
+    """Add a request to the next batch of the model."""
+    pending = await ctx.get("pending", type_hint=PendingRequests) or PendingRequests()
+    pending.requests.append(request)
+    if len(pending.requests) >= MAX_BATCH_SIZE:
+        await _submit(ctx, pending.requests)
+        return
+    if len(pending.requests) == 1:
+        # Submit the batch in time, even if it doesn't fill up. The generation only goes up,
+        # so the delayed flush of an earlier batch doesn't submit this one.
+        generation = (await ctx.get("generation", type_hint=int) or 0) + 1
+        ctx.set("generation", generation)
+        ctx.object_send(flush, key=ctx.key(), arg=generation, send_delay=MAX_BATCH_WAIT)
+    ctx.set("pending", pending)
+
+
+@batch_collector.handler()
+async def flush(ctx: restate.ObjectContext, generation: int) -> None:
+    """Submit the pending requests, unless the batch they belong to was submitted already."""
+    if generation != await ctx.get("generation", type_hint=int):
+        return
+    pending = await ctx.get("pending", type_hint=PendingRequests)
+    if pending and pending.requests:
+        await _submit(ctx, pending.requests)
+
+
+@batch_collector.handler()
+async def poll(ctx: restate.ObjectContext, batch_id: str) -> None:
+    """Check a submitted batch job, and hand out its answers once it is done."""
+    status = await ctx.run_typed("check batch", _check_batch, RunOptions(max_attempts=5), batch_id=batch_id)
+    if status.status in ("validating", "in_progress", "finalizing", "cancelling"):
+        ctx.object_send(poll, key=ctx.key(), arg=batch_id, send_delay=POLL_INTERVAL)
+        return
+
+    awakeable_ids = await ctx.get(f"batch::{batch_id}", type_hint=list[str]) or []
+    results = BatchResults()
+    if status.status == "completed":
+        results = await ctx.run_typed("fetch results", _fetch_results, RunOptions(max_attempts=5), status=status)
+    for awakeable_id in awakeable_ids:
+        if awakeable_id in results.messages:
+            ctx.resolve_awakeable(awakeable_id, results.messages[awakeable_id])
+        else:
+            error = results.errors.get(awakeable_id, f"Batch {batch_id} ended with status {status.status}")
+            ctx.reject_awakeable(awakeable_id, error)
+    ctx.clear(f"batch::{batch_id}")
+
+
+async def _submit(ctx: restate.ObjectContext, pending: list[BatchRequest]) -> None:
+    try:
+        batch_id = await ctx.run_typed(
+            "submit batch", _submit_batch, RunOptions(max_attempts=5), model=ctx.key(), requests=pending
+        )
+    except restate.TerminalError as e:
+        # The waiting steps fall back to a regular model call
+        for request in pending:
+            ctx.reject_awakeable(request.awakeable_id, f"Could not submit the batch: {e.message}")
+        ctx.clear("pending")
+        return
+    ctx.set(f"batch::{batch_id}", [request.awakeable_id for request in pending])
+    ctx.clear("pending")
+    ctx.object_send(poll, key=ctx.key(), arg=batch_id, send_delay=POLL_INTERVAL)
+
+
+async def _submit_batch(model: str, requests: list[BatchRequest]) -> str:
+    model_name = litellm.get_llm_provider(model)[0]
+    lines = []
+    for request in requests:
+        body: dict[str, Any] = {"model": model_name, "messages": request.messages}
+        if request.tools:
+            body["tools"] = request.tools
+        if request.response_format:
+            body["response_format"] = request.response_format
+        lines.append(
+            json.dumps({"custom_id": request.awakeable_id, "method": "POST", "url": "/v1/chat/completions", "body": body})
+        )
+    client = llm_client.openai_client()
+    input_file = await client.files.create(file=("batch.jsonl", io.BytesIO("\n".join(lines).encode())), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+    )
+    return batch.id
+
+
+async def _check_batch(batch_id: str) -> BatchStatus:
+    batch = await llm_client.openai_client().batches.retrieve(batch_id)
+    return BatchStatus(status=batch.status, output_file_id=batch.output_file_id, error_file_id=batch.error_file_id)
+
+
+async def _fetch_results(status: BatchStatus) -> BatchResults:
+    client = llm_client.openai_client()
+    results = BatchResults()
+    for file_id in (status.output_file_id, status.error_file_id):
+        if file_id is None:
+            continue
+        content = await client.files.content(file_id)
+        for line in content.text.splitlines():
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            if response.get("status_code") == 200:
+                results.messages[result["custom_id"]] = LlmResult.from_response(ModelResponse(**response["body"]))
+            else:
+                error = result.get("error") or response.get("body", {}).get("error") or "Request failed"
+                results.errors[result["custom_id"]] = json.dumps(error)
+    return results
@@ -0,0 +1,157 @@
+"""
+Fake OpenAI Batch API, to try the batch lane (util/batch_lane.py) offline
+
+Implements the file upload, batch creation, batch status and file content endpoints.
+A batch completes a few seconds after it was created, with a made-up answer for
+every request: a JSON object for requests with a response format, text otherwise.
+
+    uv run app/util/fake_batch_api.py
+    LLM_BATCH_LANE=1 LLM_API_BASE=http://localhost:9082/v1 OPENAI_API_KEY=fake uv run app/workflow_orchestrator.py
+"""
+
+import email.parser
+import email.policy
+import json
+import os
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds until a batch completes
+COMPLETION_DELAY = float(os.environ.get("FAKE_BATCH_COMPLETION_DELAY", 5))
+# Reject the creation of batches, like a provider that is out of batch quota
+fail_batches = os.environ.get("FAKE_BATCH_FAIL", "0") == "1"
+
+files: dict[str, bytes] = {}
+batches: dict[str, dict] = {}
+lock = threading.Lock()
+
+
+def fake_answer(body: dict) -> dict:
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        content = json.dumps(fake_value(response_format["json_schema"]["schema"]))
+    else:
+        prompt = body["messages"][-1].get("content") or ""
+        content = f"Batched answer to: {prompt[:80]}"
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+        ],
+        "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+    }
+
+
+def fake_value(schema: dict, defs: dict | None = None):
+    """A value that matches a JSON schema, as generated for Pydantic models."""
+    defs = defs if defs is not None else schema.get("$defs", {})
+    if "$ref" in schema:
+        return fake_value(defs[schema["$ref"].split("/")[-1]], defs)
+    match schema.get("type"):
+        case "object":
+            return {name: fake_value(prop, defs) for name, prop in schema.get("properties", {}).items()}
+        case "array":
+            return [fake_value(schema["items"], defs)]
+        case "integer" | "number":
+            return 1
+        case "boolean":
+            return True
+    if "enum" in schema:
+        return schema["enum"][0]
+    return "fake"
+
+
+def batch_object(batch: dict) -> dict:
+    if batch["status"] == "in_progress" and time.time() >= batch["created_at"] + COMPLETION_DELAY:
+        output = "\n".join(
+            json.dumps(
+                {
+                    "id": f"batch_req_{uuid.uuid4().hex}",
+                    "custom_id": request["custom_id"],
+                    "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": fake_answer(request["body"])},
+                    "error": None,
+                }
+            )
+            for request in map(json.loads, files[batch["input_file_id"]].decode().splitlines())
+        )
+        output_file_id = f"file-{uuid.uuid4().hex}"
+        files[output_file_id] = output.encode()
+        batch.update(status="completed", output_file_id=output_file_id, completed_at=int(time.time()))
+    return batch
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with lock:
+            if self.path == "/v1/files":
+                file_id = f"file-{uuid.uuid4().hex}"
+                files[file_id] = self._uploaded_file(body)
+                self._json({
+                    "id": file_id,
+                    "object": "file",
+                    "bytes": len(files[file_id]),
+                    "created_at": int(time.time()),
+                    "filename": "batch.jsonl",
+                    "purpose": "batch",
+                    "status": "processed",
+                })
+            elif self.path == "/v1/batches" and fail_batches:
+                self._json({"error": {"message": "Enqueued token limit reached", "type": "invalid_request_error"}}, 400)
+            elif self.path == "/v1/batches":
+                request = json.loads(body)
+                batch_id = f"batch_{uuid.uuid4().hex}"
+                batches[batch_id] = {
+                    "id": batch_id,
+                    "object": "batch",
+                    "endpoint": request["endpoint"],
+                    "input_file_id": request["input_file_id"],
+                    "completion_window": request["completion_window"],
+                    "status": "in_progress",
+                    "created_at": int(time.time()),
+                    "output_file_id": None,
+                    "error_file_id": None,
+                }
+                self._json(batches[batch_id])
+            else:
+                self.send_error(404)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        with lock:
+            if parts[:2] == ["v1", "batches"] and len(parts) == 3 and parts[2] in batches:
+                self._json(batch_object(batches[parts[2]]))
+            elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in files:
+                self._send(files[parts[2]], "application/jsonl")
+            else:
+                self.send_error(404)
+
+    def _uploaded_file(self, body: bytes) -> bytes:
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(header + body)
+        for part in message.iter_parts():
+            payload = part.get_payload(decode=True)
+            if part.get_param("name", header="content-disposition") == "file" and isinstance(payload, bytes):
+                return payload
+        raise ValueError("No file in the upload")
+
+    def _json(self, value: dict, status: int = 200):
+        self._send(json.dumps(value).encode(), "application/json", status)
+
+    def _send(self, content: bytes, content_type: str, status: int = 200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("0.0.0.0", 9082), Handler)
+    print("Fake Batch API on http://localhost:9082/v1")
+    server.serve_forever()
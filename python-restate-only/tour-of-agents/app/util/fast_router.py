@@ -0,0 +1,240 @@
+"""
+Local fast path for routing decisions
+
+A small classifier that picks the specialist for a question without a model call. It
+scores the question against one centroid per specialist, built from the specialist
+descriptions and the routing decisions the model made before, with hashed word and
+character n-grams weighted by TF-IDF. Only confident answers are used: if the best
+specialist doesn't beat the second best by the threshold, or the question is one the
+model answers directly, the question goes to the model as usual.
+
+Log the decisions of the model, and train the router from the log:
+    LLM_ROUTING_LOG=routing_log.jsonl uv run app/multi_agent.py
+    uv run app/util/fast_router.py routing_log.jsonl --out router.npz
+    LLM_FAST_ROUTER=router.npz uv run app/multi_agent.py
+
+Training prints the accuracy of the router on held-out decisions, the share of
+questions it answers itself, and its latency.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+# NumPy is only imported once a router is trained or loaded, so that the agents don't pay for it
+if TYPE_CHECKING:
+    import numpy as np
+
+DIMENSIONS = 2**16
+# Label of the decisions where the model answered directly, without a specialist
+NO_SPECIALIST = ""
+
+
+def features(text: str, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Hashed word unigrams, bigrams and character 3-5 grams of the words, with repeats."""
+    import numpy as np
+
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [padded[i : i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+    return np.array([zlib.crc32(gram.encode()) % dimensions for gram in grams], dtype=np.int64)
+
+
+@dataclass
+class Decision:
+    question: str
+    # NO_SPECIALIST if the model answered directly
+    specialist: str
+
+
+class FastRouter:
+    """Nearest-centroid classifier over TF-IDF weighted hashed n-grams, scored with cosine similarity."""
+
+    def __init__(self, labels: list[str], idf: np.ndarray, centroids: np.ndarray, threshold: float):
+        # The confidence is the margin between the two best labels
+        if len(labels) < 2:
+            raise ValueError(f"A router needs at least 2 labels to pick from, got {labels}")
+        self.labels = labels
+        self.idf = idf
+        # one L2-normalized row per label
+        self.centroids = centroids
+        self.threshold = threshold
+
+    @classmethod
+    def train(cls, specialists: dict[str, str], decisions: list[Decision], threshold: float = 0.1) -> FastRouter:
+        import numpy as np
+
+        docs = [(f"{name} {description}", name) for name, description in specialists.items()]
+        docs += [(d.question, d.specialist) for d in decisions]
+        labels = list(specialists) + sorted({label for _, label in docs} - set(specialists))
+
+        indices = [np.unique(features(text)) for text, _ in docs]
+        document_frequency = np.bincount(np.concatenate(indices), minlength=DIMENSIONS)
+        # n-grams that are in every document, like the instructions in a prompt, get no weight
+        idf = np.log((1 + len(docs)) / (1 + document_frequency)).astype(np.float32)
+
+        centroids = np.zeros((len(labels), DIMENSIONS), dtype=np.float32)
+        for text, label in docs:
+            index, weights = cls._vector(text, idf)
+            centroids[labels.index(label), index] += weights
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(labels, idf, centroids / np.maximum(norms, 1e-12), threshold)
+
+    @staticmethod
+    def _vector(text: str, idf: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sparse TF-IDF vector of the text, as indices and L2-normalized weights."""
+        import numpy as np
+
+        index, counts = np.unique(features(text), return_counts=True)
+        weights = counts * idf[index]
+        return index, weights / max(float(np.linalg.norm(weights)), 1e-12)
+
+    def scores(self, text: str) -> np.ndarray:
+        index, weights = self._vector(text, self.idf)
+        return self.centroids[:, index] @ weights
+
+    def classify(self, text: str) -> tuple[str, float]:
+        """The most similar label, and by how much it beats the second one."""
+        import numpy as np
+
+        scores = self.scores(text)
+        best, second = np.argsort(scores)[::-1][:2]
+        return self.labels[best], float(scores[best] - scores[second])
+
+    def route(self, text: str, specialists: list[str]) -> str | None:
+        """The specialist for the question, or None if the model should decide."""
+        label, confidence = self.classify(text)
+        if confidence < self.threshold or label not in specialists:
+            return None
+        return label
+
+    def save(self, path: str | Path) -> None:
+        import numpy as np
+
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                labels=np.array(self.labels),
+                idf=self.idf,
+                centroids=self.centroids,
+                threshold=np.float32(self.threshold),
+            )
+
+    @classmethod
+    def load(cls, path: str | Path, threshold: float | None = None) -> FastRouter:
+        """The saved router, with its own threshold unless another one is given."""
+        import numpy as np
+
+        with np.load(path) as data:
+            return cls(
+                [str(label) for label in data["labels"]],
+                data["idf"],
+                data["centroids"],
+                float(data["threshold"]) if threshold is None else threshold,
+            )
+
+
+def log_decision(path: str | Path, question: str, specialist: str | None) -> None:
+    with open(path, "a") as f:
+        f.write(json.dumps({"question": question, "specialist": specialist or NO_SPECIALIST}) + "\n")
+
+
+def read_decisions(path: str | Path) -> list[Decision]:
+    """The logged decisions, the latest one for questions that were routed more than once."""
+    decisions: dict[str, Decision] = {}
+    for line in Path(path).read_text().splitlines():
+        if line.strip():
+            decision = Decision(**json.loads(line))
+            decisions[decision.question] = decision
+    return list(decisions.values())
+
+
+@dataclass
+class Evaluation:
+    threshold: float
+    # share of the questions the router answered itself, and how many of those were right
+    coverage: float
+    accuracy: float
+
+
+def evaluate(router: FastRouter, decisions: list[Decision], thresholds: list[float]) -> list[Evaluation]:
+    """Coverage and accuracy of the router on decisions it wasn't trained on, per threshold."""
+    specialists = [label for label in router.labels if label != NO_SPECIALIST]
+    predictions = [router.classify(d.question) for d in decisions]
+    evaluations = []
+    for threshold in thresholds:
+        answered = [
+            (label, d.specialist)
+            for (label, confidence), d in zip(predictions, decisions)
+            if confidence >= threshold and label in specialists
+        ]
+        correct = sum(label == expected for label, expected in answered)
+        evaluations.append(
+            Evaluation(
+                threshold=threshold,
+                coverage=len(answered) / len(decisions) if decisions else 0.0,
+                accuracy=correct / len(answered) if answered else 1.0,
+            )
+        )
+    return evaluations
+
+
+if __name__ == "__main__":
+    import argparse
+    import random
+    import sys
+    import time
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from multi_agent import SPECIALISTS
+
+    parser = argparse.ArgumentParser(description="Train the fast-path router from logged routing decisions.")
+    parser.add_argument("log", help="JSONL decision log, written with LLM_ROUTING_LOG")
+    parser.add_argument("--out", default="router.npz")
+    parser.add_argument("--threshold", type=float, help="confidence threshold, by default the lowest one that reaches --target-accuracy")
+    parser.add_argument("--target-accuracy", type=float, default=0.98)
+    # With few decisions, the held-out ones are often close to the training ones, which makes any threshold look good
+    parser.add_argument("--min-threshold", type=float, default=0.05)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of the decisions to evaluate on")
+    args = parser.parse_args()
+
+    decisions = read_decisions(args.log)
+    if not decisions:
+        parser.error(f"No decisions in {args.log}")
+    random.Random(0).shuffle(decisions)
+    split = int(len(decisions) * (1 - args.holdout))
+    train, test = decisions[:split], decisions[split:]
+    print(f"{len(decisions)} decisions: training on {len(train)}, evaluating on {len(test)}")
+
+    router = FastRouter.train(SPECIALISTS, train)
+    thresholds = [args.threshold] if args.threshold is not None else [args.min_threshold + t / 100 for t in range(0, 41, 2)]
+    evaluations = evaluate(router, test, thresholds)
+    print(f"{'threshold':>9}  {'answered locally':>16}  {'accuracy':>8}")
+    for e in evaluations:
+        print(f"{e.threshold:>9.2f}  {e.coverage:>16.1%}  {e.accuracy:>8.1%}")
+    chosen = next((e for e in evaluations if e.accuracy >= args.target_accuracy), evaluations[-1])
+
+    latencies = []
+    for d in test or train:
+        start = time.perf_counter()
+        router.route(d.question, list(SPECIALISTS))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(
+        f"latency per question: p50 {latencies[len(latencies) // 2] * 1e6:.0f} us, "
+        f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} us"
+    )
+
+    router = FastRouter.train(SPECIALISTS, decisions, threshold=chosen.threshold)
+    router.save(args.out)
+    print(
+        f"Saved the router, trained on all {len(decisions)} decisions, to {args.out} with threshold {chosen.threshold:.2f}: "
+        f"{chosen.coverage:.1%} answered locally at {chosen.accuracy:.1%} accuracy on the held-out decisions"
+    )
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class HedgePolicy:
+    """When to send a second request to a fallback model, and how much that may cost.
+
+    Read from the environment with from_env, hedging is off unless LLM_HEDGE_MODEL is set:
+        LLM_HEDGE_MODEL: the fallback model, e.g. another provider
+        LLM_HEDGE_AFTER: seconds to wait for the primary model before hedging (default 10)
+        LLM_HEDGE_MAX_RATIO: at most this fraction of the calls is hedged (default 0.1)
+        LLM_HEDGE_TOKENS_PER_MINUTE: at most this many extra tokens per minute go to hedges (default 50000)
+    """
+
+    model: str
+    after: float = 10.0
+    max_ratio: float = 0.1
+    tokens_per_minute: int = 50_000
+
+    @classmethod
+    def from_env(cls) -> "HedgePolicy | None":
+        model = os.environ.get("LLM_HEDGE_MODEL")
+        if not model:
+            return None
+        return cls(
+            model=model,
+            after=float(os.environ.get("LLM_HEDGE_AFTER", 10)),
+            max_ratio=float(os.environ.get("LLM_HEDGE_MAX_RATIO", 0.1)),
+            tokens_per_minute=int(os.environ.get("LLM_HEDGE_TOKENS_PER_MINUTE", 50_000)),
+        )
+
+
+@dataclass
+class HedgeStats:
+    calls: int = 0
+    hedged: int = 0
+    # hedges that answered first
+    hedge_wins: int = 0
+    # calls that were slow enough to hedge, but the budget was used up
+    over_budget: int = 0
+    extra_tokens: int = 0
+
+
+class Hedger:
+    """Runs a call, and races it against a call of the fallback model if it is too slow.
+
+    The first successful answer wins and the other call is cancelled, which aborts its
+    HTTP request. If one call fails, the other one can still answer. Hedges are
+    limited to a fraction of all calls and to a number of tokens per minute, counting
+    the prompt of every hedge and the output of the hedges that answered.
+    """
+
+    def __init__(self, policy: HedgePolicy):
+        self.policy = policy
+        self.stats = HedgeStats()
+        # (time, tokens) of the hedges of the last minute
+        self._spent: deque[tuple[float, int]] = deque()
+
+    async def run(
+        self,
+        primary: Callable[[], Coroutine[Any, Any, T]],
+        hedge: Callable[[], Coroutine[Any, Any, T]],
+        prompt_tokens: int,
+        output_tokens: Callable[[T], int],
+    ) -> T:
+        self.stats.calls += 1
+        first = asyncio.create_task(primary())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.policy.after)
+            if done or not self._try_spend(prompt_tokens):
+                if not done:
+                    self.stats.over_budget += 1
+                return await first
+
+            self.stats.hedged += 1
+            second = asyncio.create_task(hedge())
+            tasks.append(second)
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats.hedge_wins += 1
+                            self._spend(output_tokens(task.result()))
+                        return task.result()
+            # Both failed, report the error of the primary model
+            return first.result()
+        finally:
+            # Aborts the slower request, or both if the caller was cancelled
+            for task in tasks:
+                task.cancel()
+
+    def _try_spend(self, tokens: int) -> bool:
+        now = time.monotonic()
+        while self._spent and self._spent[0][0] < now - 60:
+            self._spent.popleft()
+        spent_last_minute = sum(spent for _, spent in self._spent)
+        # One hedge is always allowed, so that a slow call early on can be hedged
+        if self.stats.hedged > self.policy.max_ratio * self.stats.calls:
+            return False
+        if spent_last_minute + tokens > self.policy.tokens_per_minute:
+            return False
+        self._spend(tokens)
+        return True
+
+    def _spend(self, tokens: int) -> None:
+        self._spent.append((time.monotonic(), tokens))
+        self.stats.extra_tokens += tokens
@@ -1,39 +1,128 @@
-import litellm
-from litellm.types.utils import Message, ModelResponse, Choices
+import os
+
+import restate
 from pydantic import BaseModel
+from restate.extensions import current_context
+
+from util.llm_cache import cache_key, get_llm_cache
+from util.llm_client import LlmClient, LlmSettings
+from util.llm_result import LlmResult
+from util.scheduler import INTERACTIVE, current_lane
+from util.singleflight import Singleflight
+
+llm_client = LlmClient(LlmSettings.from_env(default_model="gpt-5.4"))
+
+# With LLM_COALESCE=1, identical requests that are in flight at the same time, from any
+# invocation in this process, share one model call
+in_flight_calls = Singleflight[LlmResult]() if os.environ.get("LLM_COALESCE", "0") == "1" else None
 
 
 async def llm_call(
     messages: str | list[dict[str, str]],
     tools: list | None = None,
     response_format: type[BaseModel] | None = None,
-) -> Message:
+    cache: bool = True,
+    step: str | None = None,
+    lane: str | None = None,
+    tenant: str | None = None,
+    route: bool = False,
+) -> LlmResult:
     """
     Calls the model with the given prompt and returns the response.
 
     Args:
         messages (str): The user prompt to send to the model.
         tools (list, optional): List of tools for the model to use. Defaults to None.
+        cache (bool, optional): Use the response cache, if it is enabled (see util.llm_cache),
+            and share the answer with identical requests that are in flight at the same time,
+            if LLM_COALESCE is enabled. Set to False for prompts that should always get their
+            own answer. Defaults to True.
+        step (str, optional): Name of the step, to pick its model from LLM_STEP_MODELS (see util.llm_client).
+        lane (str, optional): Scheduling lane, "interactive" or "background" (see util.scheduler).
+            Background calls can't hold back interactive ones. Defaults to the lane of the
+            invocation, see background_lane.
+        tenant (str, optional): The tenant to share the capacity of the lane with fairly.
+            Defaults to the key of the Virtual Object that makes the call, e.g. the chat session.
+        route (bool, optional): The prompt is a question to pick one of the tools for, like a
+            specialist. Such calls can be answered by a local router or batched, see util.routing.
 
     Returns:
-        str: The response from the language model.
+        LlmResult: The answer of the model: its content, tool calls and token usage.
     """
+    lane = lane or current_lane()
+    tenant = tenant or _object_key() or "default"
+    if route:
+        from util.routing import route_question
+
+        assert isinstance(messages, str) and tools, "A routing call is a question with the tools to pick from"
+        return await route_question(messages, tools, step, lane, tenant)
+    return await _model_call(messages, tools, response_format, cache, step, lane, tenant)
+
+
+def _object_key() -> str | None:
+    """The key of the Virtual Object invocation that makes the call, if any."""
+    try:
+        ctx = current_context()
+    except LookupError:
+        return None
+    if not isinstance(ctx, (restate.ObjectContext, restate.ObjectSharedContext)):
+        return None
+    # Services have an empty key
+    return ctx.key() or None
+
+
+async def _model_call(
+    messages: str | list[dict[str, str]],
+    tools: list | None = None,
+    response_format: type[BaseModel] | None = None,
+    cache: bool = True,
+    step: str | None = None,
+    lane: str = INTERACTIVE,
+    tenant: str = "default",
+) -> LlmResult:
     if tools is None:
         tools = []
     if isinstance(messages, str):
         messages = [{"role": "user", "content": messages}]
-    response = await litellm.acompletion(
-        model="gpt-5.4",
+
+    # Called inside ctx.run_typed, so a cached or shared answer is journaled like a fresh one
+    llm_cache = get_llm_cache()
+    if not cache and llm_cache is not None:
+        llm_cache.stats.bypassed += 1
+    if not cache or (llm_cache is None and in_flight_calls is None):
+        return await _completion(step, lane, tenant, messages, tools, response_format)
+
+    key = cache_key(llm_client.settings.model_for(step), messages, tools, response_format)
+    if llm_cache is not None and (cached := await llm_cache.get(key)) is not None:
+        return cached
+
+    async def call_model() -> LlmResult:
+        message = await _completion(step, lane, tenant, messages, tools, response_format)
+        if llm_cache is not None:
+            await llm_cache.put(key, message)
+        return message
+
+    if in_flight_calls is None:
+        return await call_model()
+    return await in_flight_calls.do(key, call_model)
+
+
+async def _completion(
+    step: str | None,
+    lane: str,
+    tenant: str,
+    messages: list[dict[str, str]],
+    tools: list,
+    response_format: type[BaseModel] | None,
+) -> LlmResult:
+    response = await llm_client.completion(
+        step=step,
+        lane=lane,
+        tenant=tenant,
         messages=messages,
         tools=tools,
         stream=False,
         response_format=response_format,
     )
-
-    # Handle the response properly - litellm returns a ModelResponse object
-    if len(response.choices) > 0:
-        first_choice = response.choices[0]
-        if first_choice.message is not None:
-            return first_choice.message
-
-    raise RuntimeError("No content in response")
+    # Only the fields the agents use, this is what gets journaled
+    return LlmResult.from_response(response)
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+from pydantic import BaseModel
+
+from util.llm_result import LlmResult
+
+
+def cache_key(
+    model: str,
+    messages: list[dict[str, Any]],
+    tools: list | None,
+    response_format: type[BaseModel] | None,
+) -> str:
+    """Hash of everything that determines the model's answer, independent of dict key order."""
+    request = {
+        "model": model,
+        "messages": messages,
+        "tools": tools or [],
+        "response_format": response_format.model_json_schema() if response_format else None,
+    }
+    canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class LlmCache:
+    """Exact-match cache of model responses: an in-memory LRU in front of a SQLite file.
+
+    Only identical requests hit the cache, so it fits prompts that are repeated verbatim,
+    like the classification of the same question, not conversations. A cached answer
+    is returned even if the model would sample a different one, that's why it is opt-in.
+
+    Entries expire after `ttl`. Each tier keeps at most its number of entries,
+    the least recently used ones are evicted first.
+    """
+
+    def __init__(
+        self,
+        path: str = ".llm_cache.sqlite",
+        *,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10_000,
+        ttl: timedelta = timedelta(days=1),
+    ):
+        self._max_memory_entries = max_memory_entries
+        self._max_disk_entries = max_disk_entries
+        self._ttl = ttl.total_seconds()
+        # key -> (expiry time, message JSON), least recently used first
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db_lock = asyncio.Lock()
+        self.stats = CacheStats()
+
+    async def get(self, key: str) -> LlmResult | None:
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None and entry[0] > now:
+            self._memory.move_to_end(key)
+            self.stats.memory_hits += 1
+            return LlmResult.model_validate_json(entry[1])
+        self._memory.pop(key, None)
+
+        async with self._db_lock:
+            entry = await asyncio.to_thread(self._read, key, now)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self.stats.disk_hits += 1
+        self._remember(key, entry)
+        return LlmResult.model_validate_json(entry[1])
+
+    async def put(self, key: str, message: LlmResult) -> None:
+        entry = (time.time() + self._ttl, message.model_dump_json())
+        self._remember(key, entry)
+        async with self._db_lock:
+            await asyncio.to_thread(self._write, key, entry)
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _remember(self, key: str, entry: tuple[float, str]) -> None:
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _read(self, key: str, now: float) -> tuple[float, str] | None:
+        row = self._db.execute(
+            "SELECT expires, value FROM responses WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row
+
+    def _write(self, key: str, entry: tuple[float, str]) -> None:
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, entry[1], entry[0], now)
+            )
+            self._db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self._max_disk_entries,),
+            )
+
+
+_cache: LlmCache | None = None
+
+
+def get_llm_cache() -> LlmCache | None:
+    """The process-wide cache. Enabled by setting LLM_CACHE to the path of the SQLite file."""
+    global _cache
+    if _cache is None and (path := os.environ.get("LLM_CACHE")):
+        _cache = LlmCache(path)
+    return _cache
+
+
+def set_llm_cache(cache: LlmCache | None) -> None:
+    """Enable the cache in code, or disable it with None."""
+    global _cache
+    _cache = cache
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+import litellm
+from litellm.types.utils import ModelResponse
+from openai import AsyncOpenAI
+
+from util.hedging import HedgePolicy, Hedger
+from util.rate_limiter import RateLimiterClient
+from util.scheduler import INTERACTIVE, FairScheduler
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class LlmSettings:
+    """Model selection and connection settings of the model calls.
+
+    Read from the environment with from_env:
+        LLM_MODEL: the model of all steps, unless overridden for a step
+        LLM_STEP_MODELS: JSON mapping of step name to model, e.g. '{"Pick specialist": "gpt-5-mini"}'
+        LLM_API_BASE: base URL of the OpenAI models (provider "openai"), e.g. a local proxy or stub with an
+            OpenAI-compatible API. Models of other providers, like a hedge fallback, use their own endpoint.
+        LLM_TIMEOUT: seconds to wait for a model response (default 120)
+        LLM_MAX_CONNECTIONS: size of the connection pool (default 100)
+        LLM_WARM_UP: set to 0 to not open a connection to the API at startup
+        LLM_HEDGE_MODEL and related: see HedgePolicy
+        LLM_RATE_LIMITER_URL: Restate ingress URL, to take the capacity of each call from the RateLimiter
+        LLM_MAX_CONCURRENCY: number of concurrent model calls of this process, shared fairly between
+            lanes and tenants (see FairScheduler). Unlimited if not set.
+        LLM_LANE_WEIGHTS, LLM_TENANT_WEIGHTS: JSON mappings of lane and tenant to weight
+    """
+
+    model: str
+    step_models: dict[str, str] = field(default_factory=dict)
+    api_base: str | None = None
+    timeout: float = 120.0
+    connect_timeout: float = 10.0
+    max_connections: int = 100
+    warm_up: bool = True
+    hedge: HedgePolicy | None = None
+    rate_limiter_url: str | None = None
+    # Output tokens that a call is assumed to use until it reports its usage
+    expected_output_tokens: int = 1_000
+    max_concurrency: int | None = None
+    lane_weights: dict[str, float] | None = None
+    tenant_weights: dict[str, float] | None = None
+
+    @classmethod
+    def from_env(cls, default_model: str) -> "LlmSettings":
+        return cls(
+            model=os.environ.get("LLM_MODEL", default_model),
+            step_models=json.loads(os.environ.get("LLM_STEP_MODELS", "{}")),
+            api_base=os.environ.get("LLM_API_BASE"),
+            timeout=float(os.environ.get("LLM_TIMEOUT", 120)),
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", 100)),
+            warm_up=os.environ.get("LLM_WARM_UP", "1") != "0",
+            hedge=HedgePolicy.from_env(),
+            rate_limiter_url=os.environ.get("LLM_RATE_LIMITER_URL"),
+            max_concurrency=int(os.environ["LLM_MAX_CONCURRENCY"]) if "LLM_MAX_CONCURRENCY" in os.environ else None,
+            lane_weights=json.loads(os.environ.get("LLM_LANE_WEIGHTS", "null")),
+            tenant_weights=json.loads(os.environ.get("LLM_TENANT_WEIGHTS", "null")),
+        )
+
+    def model_for(self, step: str | None) -> str:
+        return self.step_models.get(step, self.model) if step else self.model
+
+
+class LlmClient:
+    """Calls models through litellm with one long-lived connection pool for the process.
+
+    OpenAI models go through a single AsyncOpenAI client, whose HTTP connections are
+    kept alive and reused by all handlers. Other providers use litellm's own clients.
+
+    With a hedge policy, calls that take too long are raced against the fallback model.
+    With a rate limiter, every call first takes its capacity from the quota of its model.
+    With a maximum concurrency, calls queue up for a slot in their lane.
+    """
+
+    def __init__(self, settings: LlmSettings):
+        self.settings = settings
+        self._openai: AsyncOpenAI | None = None
+        self.hedger = Hedger(settings.hedge) if settings.hedge else None
+        self.rate_limiter = None
+        if settings.rate_limiter_url:
+            self.rate_limiter = RateLimiterClient(settings.rate_limiter_url)
+        self.scheduler = None
+        if settings.max_concurrency:
+            self.scheduler = FairScheduler(settings.max_concurrency, settings.lane_weights, settings.tenant_weights)
+
+    def openai_client(self) -> AsyncOpenAI:
+        if self._openai is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.settings.max_connections,
+                    max_keepalive_connections=self.settings.max_connections,
+                ),
+                timeout=httpx.Timeout(self.settings.timeout, connect=self.settings.connect_timeout),
+            )
+            self._openai = AsyncOpenAI(base_url=self.settings.api_base, http_client=http_client)
+        return self._openai
+
+    async def completion(
+        self, *, step: str | None = None, lane: str = INTERACTIVE, tenant: str = "default", **kwargs: Any
+    ) -> ModelResponse:
+        if self.scheduler is None:
+            return await self._hedged_completion(step, **kwargs)
+        # Before the rate limiter, so that the lanes also decide who gets the quota first
+        async with self.scheduler.slot(lane, tenant):
+            return await self._hedged_completion(step, **kwargs)
+
+    async def _hedged_completion(self, step: str | None, **kwargs: Any) -> ModelResponse:
+        model = self.settings.model_for(step)
+        if self.hedger is None or self.hedger.policy.model == model:
+            return await self._completion(model, **kwargs)
+        policy = self.hedger.policy
+        return await self.hedger.run(
+            lambda: self._completion(model, **kwargs),
+            lambda: self._completion(policy.model, **kwargs),
+            prompt_tokens=_estimate_tokens(kwargs.get("messages")),
+            output_tokens=_completion_tokens,
+        )
+
+    async def _completion(self, model: str, **kwargs: Any) -> ModelResponse:
+        model_name, provider, _, _ = litellm.get_llm_provider(model)
+        if provider == "openai":
+            kwargs["client"] = self.openai_client()
+        if self.rate_limiter is None:
+            return await litellm.acompletion(model=model, timeout=self.settings.timeout, **kwargs)
+
+        key = f"{provider}/{model_name}"
+        estimated_tokens = _estimate_tokens(kwargs.get("messages")) + self.settings.expected_output_tokens
+        estimated_tokens = await self.rate_limiter.acquire(key, estimated_tokens)
+        response = await litellm.acompletion(model=model, timeout=self.settings.timeout, **kwargs)
+        usage = getattr(response, "usage", None)
+        if usage:
+            self.rate_limiter.settle(key, estimated_tokens, usage.total_tokens)
+        return response
+
+    async def warm_up(self) -> None:
+        """Open a connection to the API before the first request needs it. Failures are only logged."""
+        if not self.settings.warm_up:
+            return
+        try:
+            if litellm.get_llm_provider(self.settings.model)[1] == "openai":
+                await self.openai_client().models.list()
+        except Exception as e:
+            logger.warning("Could not warm up the connection to the model API: %s", e)
+
+    async def close(self) -> None:
+        if self._openai is not None:
+            await self._openai.close()
+            self._openai = None
+        if self.rate_limiter is not None:
+            await self.rate_limiter.close()
+
+
+def _completion_tokens(response: ModelResponse) -> int:
+    # usage is set on the response by litellm, it isn't a declared field of ModelResponse
+    usage = getattr(response, "usage", None)
+    return usage.completion_tokens if usage else 0
+
+
+def _estimate_tokens(messages: Any) -> int:
+    """Rough token count of the prompt, about 4 characters per token."""
+    return len(json.dumps(messages, default=str)) // 4
@@ -0,0 +1,68 @@
+from typing import Any
+
+from litellm.types.utils import ChatCompletionMessageToolCall, Choices, ModelResponse
+from pydantic import BaseModel, SerializerFunctionWrapHandler, model_serializer
+
+
+class FunctionCall(BaseModel):
+    name: str
+    # JSON object, as generated by the model
+    arguments: str = "{}"
+
+
+class ToolCall(BaseModel):
+    id: str
+    function: FunctionCall
+
+
+class Usage(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LlmResult(BaseModel):
+    """The answer of a model call: its text, the tools it calls, and the tokens it used.
+
+    This is what llm_call returns, and so what ctx.run_typed journals for every model
+    call. It only has the fields the agents use, instead of everything litellm and the
+    provider return, and leaves out the empty ones when serialized. Like litellm's
+    Message, tool_calls is None if the model didn't call any tools.
+    """
+
+    content: str | None = None
+    tool_calls: list[ToolCall] | None = None
+    usage: Usage | None = None
+
+    @model_serializer(mode="wrap")
+    def _leave_out_empty(self, handler: SerializerFunctionWrapHandler) -> dict[str, Any]:
+        # Also for the serde of ctx.run_typed, which serializes with model_dump_json()
+        return {name: value for name, value in handler(self).items() if value is not None}
+
+    @classmethod
+    def from_response(cls, response: ModelResponse) -> "LlmResult":
+        # A non-streaming response only has full choices
+        choice = response.choices[0] if response.choices else None
+        if not isinstance(choice, Choices) or choice.message is None:
+            raise RuntimeError("No content in response")
+        message = choice.message
+        # Only function tools, the agents don't define custom ones
+        function_calls = [call for call in message.tool_calls or [] if isinstance(call, ChatCompletionMessageToolCall)]
+        usage = getattr(response, "usage", None)
+        return cls(
+            content=message.content,
+            tool_calls=[
+                ToolCall(id=call.id, function=FunctionCall(name=call.function.name or "", arguments=call.function.arguments))
+                for call in function_calls
+            ]
+            or None,
+            usage=Usage(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens) if usage else None,
+        )
+
+    def to_message(self) -> dict[str, Any]:
+        """The answer as an assistant message, to continue the conversation with."""
+        message: dict[str, Any] = {"role": "assistant", "content": self.content}
+        if self.tool_calls:
+            message["tool_calls"] = [
+                {"id": call.id, "type": "function", "function": call.function.model_dump()} for call in self.tool_calls
+            ]
+        return message
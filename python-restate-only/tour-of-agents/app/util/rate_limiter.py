@@ -0,0 +1,252 @@
+"""
+Rate limiter for model calls
+
+A token bucket per provider/model, as a Restate Virtual Object, so that all agents share
+the requests-per-minute and tokens-per-minute quota of the provider. Calls lease capacity
+in batches and keep it locally, so most model calls don't need a round trip.
+
+The quota is configured on the service, not by the agents, so that they can't disagree
+about it: LLM_RPM and LLM_TPM of the service are the quota of every model (default 500
+requests and 500000 tokens per minute), and set_quota overrides it for one model.
+
+Deploy the service, register it, and point llm_call at the Restate ingress:
+    LLM_RPM=500 LLM_TPM=500000 uv run app/util/rate_limiter.py
+    curl localhost:8080/RateLimiter/openai%2Fgpt-5-mini/set_quota --json '{"requests_per_minute": 1000, "tokens_per_minute": 2000000}'
+    LLM_RATE_LIMITER_URL=http://localhost:8080 uv run app/multi_agent.py
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from urllib.parse import quote
+
+import httpx
+import restate
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+class Quota(BaseModel):
+    # The bucket refills at this rate, and holds at most one minute of it
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+DEFAULT_QUOTA = Quota(
+    requests_per_minute=int(os.environ.get("LLM_RPM", 500)),
+    tokens_per_minute=int(os.environ.get("LLM_TPM", 500_000)),
+)
+
+
+class LeaseRequest(BaseModel):
+    requests: int
+    tokens: int
+
+
+class Release(BaseModel):
+    requests: int
+    tokens: int
+
+
+class Lease(BaseModel):
+    requests: int = 0
+    tokens: int = 0
+    # If nothing was granted: seconds until there is enough capacity
+    retry_after: float = 0.0
+
+
+class Bucket(BaseModel):
+    requests: float
+    tokens: float
+    updated: float
+
+
+# Keyed by provider/model, e.g. "openai/gpt-5.4"
+rate_limiter = restate.VirtualObject("RateLimiter")
+
+
+@rate_limiter.handler()
+async def set_quota(ctx: restate.ObjectContext, quota: Quota) -> None:
+    """Set the quota of this model, instead of the default quota of the service."""
+    ctx.set("quota", quota)
+
+
+async def _bucket(ctx: restate.ObjectContext, quota: Quota) -> Bucket:
+    """The bucket, refilled for the time since it was last used."""
+    now = await ctx.run_typed("now", time.time)
+    rpm, tpm = quota.requests_per_minute, quota.tokens_per_minute
+    bucket = await ctx.get("bucket", type_hint=Bucket) or Bucket(requests=rpm, tokens=tpm, updated=now)
+    elapsed = max(0.0, now - bucket.updated)
+    bucket.requests = min(rpm, bucket.requests + elapsed * rpm / 60)
+    bucket.tokens = min(tpm, bucket.tokens + elapsed * tpm / 60)
+    bucket.updated = now
+    return bucket
+
+
+@rate_limiter.handler()
+async def lease(ctx: restate.ObjectContext, req: LeaseRequest) -> Lease:
+    """Grant up to the requested capacity, at least enough for one call, or say when to come back."""
+    quota = await ctx.get("quota", type_hint=Quota) or DEFAULT_QUOTA
+    rpm, tpm = quota.requests_per_minute, quota.tokens_per_minute
+    bucket = await _bucket(ctx, quota)
+
+    tokens_per_call = min(tpm, math.ceil(req.tokens / req.requests))
+    if bucket.requests < 1 or bucket.tokens < tokens_per_call:
+        ctx.set("bucket", bucket)
+        retry_after = max((1 - bucket.requests) * 60 / rpm, (tokens_per_call - bucket.tokens) * 60 / tpm)
+        return Lease(retry_after=retry_after)
+
+    granted = min(req.requests, int(bucket.requests), int(bucket.tokens // tokens_per_call))
+    bucket.requests -= granted
+    bucket.tokens -= granted * tokens_per_call
+    ctx.set("bucket", bucket)
+    return Lease(requests=granted, tokens=granted * tokens_per_call)
+
+
+@rate_limiter.handler()
+async def release(ctx: restate.ObjectContext, req: Release) -> None:
+    """Give back leased capacity that wasn't used."""
+    quota = await ctx.get("quota", type_hint=Quota) or DEFAULT_QUOTA
+    bucket = await _bucket(ctx, quota)
+    bucket.requests = min(quota.requests_per_minute, bucket.requests + req.requests)
+    bucket.tokens = min(quota.tokens_per_minute, bucket.tokens + req.tokens)
+    ctx.set("bucket", bucket)
+
+
+@dataclass
+class RateLimitStats:
+    calls: int = 0
+    # round trips to the RateLimiter object
+    leases: int = 0
+    releases: int = 0
+    # calls that had to wait for capacity, and the total time they waited
+    waits: int = 0
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class _LocalLease:
+    requests: int = 0
+    tokens: int = 0
+    expires: float = 0.0
+
+
+class RateLimiterClient:
+    """Takes capacity for model calls from the RateLimiter object, through the Restate ingress.
+
+    Leases `batch` calls at a time and hands them out locally. Leased capacity that
+    isn't used within `lease_ttl` seconds is given back, so that an idle process doesn't
+    hold on to quota. The tokens of a call are estimated up front and corrected with
+    its actual usage.
+    """
+
+    def __init__(self, ingress_url: str, *, batch: int = 10, lease_ttl: float = 10.0):
+        self._ingress_url = ingress_url.rstrip("/")
+        self._batch = batch
+        self._lease_ttl = lease_ttl
+        self._leases: dict[str, _LocalLease] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._releases: dict[str, asyncio.Task[None]] = {}
+        self._http = httpx.AsyncClient(timeout=10)
+        self.stats = RateLimitStats()
+
+    async def acquire(self, key: str, tokens: int) -> int:
+        """Wait until there is capacity for one call of about the given number of tokens.
+
+        Returns the tokens taken for the call, to settle it with. A call can't take more
+        than the tokens per minute of the quota, larger estimates are capped to that.
+        """
+        self.stats.calls += 1
+        start = time.monotonic()
+        waited = False
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        local = self._leases.setdefault(key, _LocalLease())
+        while True:
+            # Only one lease round trip per key at a time, but the lock isn't held while waiting
+            async with lock:
+                if local.requests >= 1 and local.tokens >= tokens:
+                    local.requests -= 1
+                    local.tokens -= tokens
+                    break
+                lease = await self._lease(key, tokens)
+                if lease.requests > 0:
+                    local.requests += lease.requests
+                    local.tokens += lease.tokens
+                    local.expires = time.monotonic() + self._lease_ttl
+                    if key not in self._releases:
+                        self._releases[key] = asyncio.create_task(self._release_when_expired(key))
+                    # The lease grants calls of at most the tokens per minute of the quota
+                    tokens = min(tokens, lease.tokens // lease.requests)
+                    continue
+            waited = True
+            await asyncio.sleep(lease.retry_after)
+        if waited:
+            self.stats.waits += 1
+            self.stats.wait_seconds += time.monotonic() - start
+        return tokens
+
+    def settle(self, key: str, estimated_tokens: int, used_tokens: int) -> None:
+        """Correct the tokens taken for a finished call. Overuse is taken from the next calls."""
+        local = self._leases.get(key)
+        if local is not None:
+            local.tokens += estimated_tokens - used_tokens
+
+    async def close(self) -> None:
+        """Give back the capacity of all leases."""
+        for task in self._releases.values():
+            task.cancel()
+        self._releases.clear()
+        for key, local in self._leases.items():
+            await self._release(key, local)
+        await self._http.aclose()
+
+    async def _release_when_expired(self, key: str) -> None:
+        local = self._leases[key]
+        while True:
+            await asyncio.sleep(max(0.0, local.expires - time.monotonic()))
+            async with self._locks[key]:
+                # Calls since then can have taken a new lease
+                if local.expires <= time.monotonic():
+                    del self._releases[key]
+                    await self._release(key, local)
+                    return
+
+    async def _release(self, key: str, local: _LocalLease) -> None:
+        # Tokens that calls used beyond their estimate are gone, they aren't taken back from the quota
+        release = Release(requests=local.requests, tokens=max(0, local.tokens))
+        local.requests, local.tokens = 0, 0
+        if release.requests == 0 and release.tokens == 0:
+            return
+        self.stats.releases += 1
+        try:
+            await self._post(key, "release", release)
+        except httpx.HTTPError as e:
+            logger.warning("Could not give back the lease of %s: %s", key, e)
+
+    async def _lease(self, key: str, tokens: int) -> Lease:
+        self.stats.leases += 1
+        response = await self._post(key, "lease", LeaseRequest(requests=self._batch, tokens=self._batch * tokens))
+        return Lease.model_validate_json(response.content)
+
+    async def _post(self, key: str, handler: str, request: BaseModel) -> httpx.Response:
+        response = await self._http.post(
+            f"{self._ingress_url}/RateLimiter/{quote(key, safe='')}/{handler}",
+            content=request.model_dump_json(),
+            headers={"Content-Type": "application/json"},
+        )
+        response.raise_for_status()
+        return response
+
+
+if __name__ == "__main__":
+    import hypercorn
+
+    app = restate.app(services=[rate_limiter])
+
+    conf = hypercorn.Config()
+    conf.bind = ["0.0.0.0:9081"]
+    asyncio.run(hypercorn.asyncio.serve(app, conf))
@@ -0,0 +1,156 @@
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from pydantic import BaseModel
+
+from util.llm_result import FunctionCall, LlmResult, ToolCall
+from util.scheduler import INTERACTIVE
+
+# Calls the model, with the arguments of llm_call
+ModelCall = Callable[..., Awaitable[LlmResult]]
+
+
+class Route(BaseModel):
+    id: int
+    # name of the specialist, or None to answer directly
+    specialist: str | None
+    answer: str | None
+
+
+class Routes(BaseModel):
+    routes: list[Route]
+
+
+@dataclass
+class RouteBatchStats:
+    requests: int = 0
+    # model calls made for the batches
+    batches: int = 0
+    # requests that were not in the answer of their batch, and got their own call
+    fallbacks: int = 0
+
+    @property
+    def requests_per_call(self) -> float:
+        calls = self.batches + self.fallbacks
+        return self.requests / calls if calls else 0.0
+
+
+@dataclass
+class _Batch:
+    tools: list
+    specialists: dict[str, str]
+    step: str | None
+    lane: str
+    # question, tenant and answer of each request
+    requests: list[tuple[str, str, asyncio.Future[LlmResult]]] = field(default_factory=list)
+    timer: asyncio.TimerHandle | None = None
+
+
+class RouteBatcher:
+    """Classifies routing requests that arrive within a short window together, in one model call.
+
+    A request is a question and the specialists to pick from, as tools. The first
+    request of a batch waits `window` seconds for others with the same specialists,
+    or until there are `max_size`. The model answers with a specialist or a short
+    direct answer for every question, and every request gets a message like that of
+    a regular routing call: a tool call of the specialist, or the answer as content.
+    Requests without a route in the answer get their own call. Batches are per process
+    and per lane, and the batch call counts for the tenant of its first request.
+    """
+
+    def __init__(self, call_model: ModelCall, window: float, max_size: int = 16):
+        self._call_model = call_model
+        self._window = window
+        self._max_size = max_size
+        self._batches: dict[str, _Batch] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.stats = RouteBatchStats()
+
+    async def route(
+        self, question: str, tools: list, step: str | None = None, lane: str = INTERACTIVE, tenant: str = "default"
+    ) -> LlmResult:
+        self.stats.requests += 1
+        specialists = {t["function"]["name"]: t["function"].get("description", "") for t in tools}
+        key = json.dumps([step, lane, specialists], sort_keys=True)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch(tools=tools, specialists=specialists, step=step, lane=lane)
+            batch.timer = asyncio.get_running_loop().call_later(self._window, self._flush, key)
+        answer = asyncio.get_running_loop().create_future()
+        batch.requests.append((question, tenant, answer))
+        if len(batch.requests) >= self._max_size:
+            if batch.timer is not None:
+                batch.timer.cancel()
+            self._flush(key)
+        # The batch goes on if this caller is cancelled, e.g. a racing agent that lost
+        return await asyncio.shield(answer)
+
+    def _flush(self, key: str) -> None:
+        batch = self._batches.pop(key)
+        task = asyncio.create_task(self._classify(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _classify(self, batch: _Batch) -> None:
+        self.stats.batches += 1
+        specialists = "\n".join(f"- {name}: {desc}" for name, desc in batch.specialists.items())
+        questions = "\n".join(f"{i}: {json.dumps(question)}" for i, (question, _, _) in enumerate(batch.requests))
+        try:
+            result = await self._call_model(
+                f"""You are a customer service routing system.
+                For each of the numbered requests below, choose the appropriate specialist,
+                or give a short answer directly if no specialist is needed.
+                Return one route per request, with its number as id.
+
+                Specialists:
+                {specialists}
+
+                Requests:
+                {questions}""",
+                response_format=Routes,
+                cache=False,
+                step=batch.step,
+                lane=batch.lane,
+                tenant=batch.requests[0][1],
+            )
+            routes = {route.id: route for route in Routes.model_validate_json(result.content or "").routes}
+        except Exception as e:
+            for _, _, answer in batch.requests:
+                if not answer.done():
+                    answer.set_exception(e)
+            return
+
+        await asyncio.gather(
+            *(
+                self._answer(batch, i, question, tenant, answer, routes.get(i))
+                for i, (question, tenant, answer) in enumerate(batch.requests)
+            )
+        )
+
+    async def _answer(
+        self, batch: _Batch, i: int, question: str, tenant: str, answer: asyncio.Future[LlmResult], route: Route | None
+    ):
+        if route is not None and route.specialist in batch.specialists:
+            message = specialist_message(route.specialist, f"route_{i}")
+        elif route is not None and route.specialist is None and route.answer:
+            message = LlmResult(content=route.answer)
+        else:
+            self.stats.fallbacks += 1
+            try:
+                message = await self._call_model(
+                    question, tools=batch.tools, step=batch.step, lane=batch.lane, tenant=tenant
+                )
+            except Exception as e:
+                if not answer.done():
+                    answer.set_exception(e)
+                return
+        if not answer.done():
+            answer.set_result(message)
+
+
+def specialist_message(specialist: str, call_id: str) -> LlmResult:
+    """The answer of a routing call that picked the specialist: a call of its tool."""
+    return LlmResult(tool_calls=[ToolCall(id=call_id, function=FunctionCall(name=specialist))])
+
@@ -0,0 +1,49 @@
+"""
+Routing calls: questions for the model to pick one of the specialists (tools) for
+
+llm_call(..., route=True) sends its question here, like the routers in multi_agent.py
+and remote_agents.py do. Without any of these settings, it is a regular model call:
+    LLM_FAST_ROUTER: a trained router (see util.fast_router). Questions that it routes with
+        confidence don't go to the model. LLM_FAST_ROUTER_THRESHOLD overrides its threshold.
+    LLM_ROUTE_BATCH_WINDOW_MS: classify the concurrent routing calls of this process together,
+        in one model call per window (see util.route_batcher). LLM_ROUTE_BATCH_MAX_SIZE caps
+        the number of questions per call (default 16).
+    LLM_ROUTING_LOG: append the decisions of the model to that file, to train the router with.
+"""
+
+import os
+
+from util.fast_router import FastRouter, log_decision
+from util.litellm_call import llm_call
+from util.llm_result import LlmResult
+from util.route_batcher import RouteBatcher, specialist_message
+
+_window_ms = os.environ.get("LLM_ROUTE_BATCH_WINDOW_MS")
+route_batcher = (
+    RouteBatcher(llm_call, float(_window_ms) / 1000, int(os.environ.get("LLM_ROUTE_BATCH_MAX_SIZE", 16)))
+    if _window_ms
+    else None
+)
+routing_log = os.environ.get("LLM_ROUTING_LOG")
+
+_threshold = os.environ.get("LLM_FAST_ROUTER_THRESHOLD")
+fast_router = (
+    FastRouter.load(os.environ["LLM_FAST_ROUTER"], float(_threshold) if _threshold else None)
+    if os.environ.get("LLM_FAST_ROUTER")
+    else None
+)
+
+
+async def route_question(question: str, tools: list, step: str | None, lane: str, tenant: str) -> LlmResult:
+    """The answer of a routing call: a call of the tool of the picked specialist, or a direct answer."""
+    specialists = [t["function"]["name"] for t in tools]
+    if fast_router is not None and (specialist := fast_router.route(question, specialists)):
+        return specialist_message(specialist, "fast_route")
+
+    if route_batcher is None:
+        message = await llm_call(question, tools=tools, step=step, lane=lane, tenant=tenant)
+    else:
+        message = await route_batcher.route(question, tools, step, lane, tenant)
+    if routing_log:
+        log_decision(routing_log, question, message.tool_calls[0].function.name if message.tool_calls else None)
+    return message
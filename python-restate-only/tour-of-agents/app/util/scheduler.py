@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+DEFAULT_LANE_WEIGHTS = {INTERACTIVE: 8, BACKGROUND: 1}
+
+_lane = contextvars.ContextVar("llm_lane", default=INTERACTIVE)
+
+
+def current_lane() -> str:
+    """The lane of the model calls of the current invocation, interactive unless set otherwise."""
+    return _lane.get()
+
+
+@asynccontextmanager
+async def background_lane() -> AsyncIterator[None]:
+    """Puts the model calls of an invocation in the background lane.
+
+    Pass it to the invocation_context_managers of a Restate service whose handlers can wait,
+    e.g. restate.Service("ResearchWorker", invocation_context_managers=[background_lane]).
+    """
+    token = _lane.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+@dataclass
+class LaneStats:
+    calls: int = 0
+    # calls that were queued, and their queueing delay
+    queued: int = 0
+    delay_seconds: float = 0.0
+    max_delay_seconds: float = 0.0
+
+    @property
+    def mean_delay_seconds(self) -> float:
+        return self.delay_seconds / self.calls if self.calls else 0.0
+
+
+@dataclass
+class _Queue:
+    """A lane or a tenant, with its place in the weighted order. The root has the lanes as children, lanes have tenants."""
+
+    name: str
+    weight: float
+    # the queue with the lowest pass goes next, each turn adds 1/weight
+    pass_: float = 0.0
+    # the pass of the child that went last, the position that idle children rejoin at
+    virtual_time: float = 0.0
+    # number of waiting calls, and for a tenant the calls themselves
+    waiting: int = 0
+    waiters: deque[asyncio.Future] = field(default_factory=deque)
+    children: dict[str, "_Queue"] = field(default_factory=dict)
+
+
+class FairScheduler:
+    """Shares a number of concurrent model calls between lanes and, within a lane, between tenants.
+
+    Every call waits for one of `max_concurrency` slots. When calls queue up, the
+    free slots go to the lanes in proportion to their weights, e.g. 8 interactive
+    calls for each background call, and within a lane to the tenants in proportion
+    to theirs. A lane or tenant without waiting calls doesn't build up credit: it
+    rejoins at the current position, so a burst after a quiet period can't take
+    all slots. Unknown lanes and tenants have weight 1.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        lane_weights: dict[str, float] | None = None,
+        tenant_weights: dict[str, float] | None = None,
+    ):
+        self._max_concurrency = max_concurrency
+        self._lane_weights = lane_weights or DEFAULT_LANE_WEIGHTS
+        self._tenant_weights = tenant_weights or {}
+        self._running = 0
+        self._root = _Queue(name="", weight=1)
+        self.stats: dict[str, LaneStats] = {}
+
+    @asynccontextmanager
+    async def slot(self, lane: str = INTERACTIVE, tenant: str = "default") -> AsyncIterator[None]:
+        """Hold one of the slots for the duration of a model call."""
+        start = time.monotonic()
+        stats = self.stats.setdefault(lane, LaneStats())
+        if self._running < self._max_concurrency and not self._root.waiting:
+            self._running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            self._enqueue(lane, tenant, waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was granted just before the cancellation
+                    self._release()
+                else:
+                    self._dequeue(lane, tenant, waiter)
+                raise
+            delay = time.monotonic() - start
+            stats.queued += 1
+            stats.delay_seconds += delay
+            stats.max_delay_seconds = max(stats.max_delay_seconds, delay)
+        stats.calls += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _enqueue(self, lane_name: str, tenant_name: str, waiter: asyncio.Future) -> None:
+        lane = self._join(self._root, lane_name, self._lane_weights.get(lane_name, 1))
+        tenant = self._join(lane, tenant_name, self._tenant_weights.get(tenant_name, 1))
+        tenant.waiters.append(waiter)
+        for queue in (self._root, lane, tenant):
+            queue.waiting += 1
+
+    @staticmethod
+    def _join(parent: _Queue, name: str, weight: float) -> _Queue:
+        queue = parent.children.setdefault(name, _Queue(name=name, weight=weight))
+        if not queue.waiting:
+            # Rejoin at the position of the queues that are waiting, without credit for the idle time
+            active = [q.pass_ for q in parent.children.values() if q.waiting]
+            queue.pass_ = max(queue.pass_, min(active, default=parent.virtual_time))
+        return queue
+
+    def _dequeue(self, lane_name: str, tenant_name: str, waiter: asyncio.Future) -> None:
+        lane = self._root.children[lane_name]
+        tenant = lane.children[tenant_name]
+        tenant.waiters.remove(waiter)
+        for queue in (self._root, lane, tenant):
+            queue.waiting -= 1
+        self._forget_idle(lane, tenant_name)
+
+    def _release(self) -> None:
+        self._running -= 1
+        while self._running < self._max_concurrency and self._root.waiting:
+            lane = self._next(self._root)
+            tenant = self._next(lane)
+            waiter = tenant.waiters.popleft()
+            for queue in (self._root, lane, tenant):
+                queue.waiting -= 1
+            self._forget_idle(lane, tenant.name)
+            self._running += 1
+            waiter.set_result(None)
+
+    @staticmethod
+    def _forget_idle(lane: _Queue, tenant_name: str) -> None:
+        # There can be many tenants, e.g. one per chat session. An idle one would rejoin at the current position anyway.
+        if not lane.children[tenant_name].waiting:
+            del lane.children[tenant_name]
+
+    @staticmethod
+    def _next(parent: _Queue) -> _Queue:
+        queue = min((q for q in parent.children.values() if q.waiting), key=lambda q: q.pass_)
+        queue.pass_ += 1 / queue.weight
+        # Not parent.pass_, that is the position of the parent among its own siblings
+        parent.virtual_time = queue.pass_
+        return queue
@@ -0,0 +1,50 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleflightStats:
+    calls: int = 0
+    # calls that joined a request that was already in flight
+    coalesced: int = 0
+
+    @property
+    def coalesced_rate(self) -> float:
+        return self.coalesced / self.calls if self.calls else 0.0
+
+
+class Singleflight(Generic[T]):
+    """Runs at most one call per key at a time. Concurrent calls with the same key share its result.
+
+    The call runs in its own task: if the caller that started it is cancelled (e.g. a
+    racing agent that lost), the others still get the result. Errors go to all waiters.
+    Nothing is kept after the call finished, the next call with the key starts a new one.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task[T]] = {}
+        self.stats = SingleflightStats()
+
+    async def do(self, key: str, fn: Callable[[], Coroutine[Any, Any, T]]) -> T:
+        self.stats.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        else:
+            self.stats.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Retrieve the error, in case all waiters were cancelled before it arrived
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
@@ -9,7 +9,8 @@ import restate
 from pydantic import BaseModel
 from restate import RunOptions
 
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
+from util.scheduler import background_lane
 
 
 class CodeRequest(BaseModel):
@@ -17,7 +18,7 @@ class CodeRequest(BaseModel):
 
 
 # <start_here>
-code_service = restate.Service("CodeGenerator")
+code_service = restate.Service("CodeGenerator", invocation_context_managers=[background_lane])
 
 
 @code_service.handler()
@@ -69,4 +70,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
@@ -11,7 +11,9 @@ import restate
 from pydantic import BaseModel
 from restate import RunOptions
 
-from util.litellm_call import llm_call
+from util.batch_lane import BATCH_LANE, batch_collector, batch_llm_call
+from util.litellm_call import llm_call, llm_client
+from util.scheduler import background_lane
 
 
 class ReportRequest(BaseModel):
@@ -27,7 +29,7 @@ class TaskList(BaseModel):
 
 
 # <start_here>
-researcher_service = restate.Service("ResearchWorker")
+researcher_service = restate.Service("ResearchWorker", invocation_context_managers=[background_lane])
 
 
 @researcher_service.handler()
@@ -41,7 +43,7 @@ async def research(ctx: restate.Context, req: ResearchTask) -> dict:
     return {"question": req.question, "answer": answer.content}
 
 
-report_service = restate.Service("ResearchReport")
+report_service = restate.Service("ResearchReport", invocation_context_managers=[background_lane])
 
 
 @report_service.handler()
@@ -58,10 +60,11 @@ async def generate(ctx: restate.Context, req: ReportRequest) -> dict:
         raise restate.TerminalError("No research plan created")
     tasks = TaskList.model_validate_json(plan_result.content).tasks
 
-    # Step 2: Dispatch workers in parallel
+    # Step 2: Dispatch workers in parallel, through the Batch API if LLM_BATCH_LANE=1
+    worker = research_in_batch if BATCH_LANE else research
     worker_promises = []
     for task in tasks:
-        promise = ctx.service_call(research, task)
+        promise = ctx.service_call(worker, task)
         worker_promises.append(promise)
 
     await restate.gather(*worker_promises)
@@ -82,12 +85,29 @@ async def generate(ctx: restate.Context, req: ReportRequest) -> dict:
 # <end_here>
 
 
+@researcher_service.handler()
+async def research_in_batch(ctx: restate.Context, req: ResearchTask) -> dict:
+    """Like research, through the Batch API (see util.batch_lane). The report uses it with LLM_BATCH_LANE=1."""
+    answer = await batch_llm_call(
+        ctx,
+        "Research",
+        messages=f"You are a research assistant. Provide a concise, factual answer. {req.question}",
+    )
+    return {"question": req.question, "answer": answer.content}
+
+
 if __name__ == "__main__":
     import asyncio
     import hypercorn
 
-    app = restate.app(services=[report_service, researcher_service])
+    app = restate.app(services=[report_service, researcher_service, batch_collector])
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
@@ -12,7 +12,7 @@ from restate import RunOptions
 
 from util.util import ClaimEvaluation
 from util.util import ClaimData, convert_currency, process_payment, ClaimPrompt
-from util.litellm_call import llm_call
+from util.litellm_call import llm_call, llm_client
 
 # <start_here>
 claim_service = restate.Service("ClaimReimbursement")
@@ -85,4 +85,10 @@ if __name__ == "__main__":
 
     conf = hypercorn.Config()
     conf.bind = ["0.0.0.0:9080"]
-    asyncio.run(hypercorn.asyncio.serve(app, conf))
+
+    async def main():
+        # Open the connection to the model API before the first request needs it
+        await llm_client.warm_up()
+        await hypercorn.asyncio.serve(app, conf)
+
+    asyncio.run(main())
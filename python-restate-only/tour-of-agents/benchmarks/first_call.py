@@ -0,0 +1,137 @@
+"""Latency of the first and following model calls, with a cold and a warmed-up connection pool.
+
+Starts a local OpenAI-compatible stub and runs each mode in a fresh interpreter, the way a
+new deployment of an agent handles its first request:
+
+    litellm    litellm.acompletion with its default clients, as llm_call did before
+    cold       llm_call through the pooled LlmClient, without warming up
+    warm       llm_call through the pooled LlmClient, after LlmClient.warm_up()
+
+The stub delays every new connection by --connect-ms, to stand in for the TCP and TLS
+handshakes with a remote API, which a localhost connection doesn't have.
+
+Usage:
+    uv run benchmarks/first_call.py [--runs 5] [--connect-ms 150]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+COMPLETION = {
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "gpt-5.4",
+    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "Hello!"}}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7},
+}
+
+# Prints the seconds between the start of the call (or warm-up) and the first and second response
+MEASURE = """
+import asyncio, time
+
+async def main():
+    from util.litellm_call import llm_call, llm_client
+    import litellm
+    start = time.perf_counter()
+    if "{mode}" == "warm":
+        await llm_client.warm_up()
+        # the warm-up runs at startup, before the first request arrives
+        start = time.perf_counter()
+    if "{mode}" == "litellm":
+        call = lambda: litellm.acompletion(model="gpt-5.4", api_base="{api_base}", messages=[{{"role": "user", "content": "Hi"}}])
+    else:
+        call = lambda: llm_call("Hi", cache=False)
+    await call()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    await call()
+    print(first, time.perf_counter() - start)
+
+asyncio.run(main())
+"""
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._reply({"object": "list", "data": [{"id": "gpt-5.4", "object": "model", "created": 0, "owned_by": "stub"}]})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply(COMPLETION)
+
+    def _reply(self, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    connect_delay = 0.0
+
+    def process_request(self, request, client_address):
+        # Once per connection, the connection serves all of its requests
+        time.sleep(self.connect_delay)
+        super().process_request(request, client_address)
+
+
+def measure(mode: str, api_base: str, runs: int) -> tuple[float, float]:
+    env = {
+        **os.environ,
+        "LLM_API_BASE": api_base,
+        "OPENAI_API_KEY": "stub",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    }
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(mode=mode, api_base=api_base)],
+            cwd=APP_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.split()
+        samples.append([float(value) * 1000 for value in output[-2:]])
+    return tuple(statistics.median(column) for column in zip(*samples))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--connect-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.connect_delay = args.connect_ms / 1000
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_port}/v1"
+
+    print(f"{'mode':<10} {'first call ms':>14} {'second call ms':>15}")
+    for mode in ("litellm", "cold", "warm"):
+        first, second = measure(mode, api_base, args.runs)
+        print(f"{mode:<10} {first:>14.1f} {second:>15.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
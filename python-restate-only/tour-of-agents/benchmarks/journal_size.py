@@ -0,0 +1,195 @@
+"""Journal bytes of the model calls of the tour handlers.
+
+ctx.run_typed journals the result of every llm_call step, serialized with the serde of
+the return type of llm_call. This runs the llm_call steps of the handlers against a local
+OpenAI-compatible stub, with the same prompts, tools and response formats, and reports
+the size of their journaled results, and the time to serialize and deserialize them.
+
+The stub answers like the OpenAI API: text, structured output, or tool calls, with the
+usual extra fields (refusal, annotations, token details, ...).
+
+Usage:
+    uv run benchmarks/journal_size.py
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+# litellm sends calls with tools of newer models to the Responses API, which the stub doesn't have
+os.environ.setdefault("LLM_MODEL", "gpt-4.1")
+
+ANSWER = (
+    "Based on the information provided, the claim meets the conditions for reimbursement. "
+    "The treatment is covered by the policy, the amount is in line with the usual costs for this "
+    "procedure, and there are no signs of fraud. I recommend approving the claim and processing the "
+    "payment within the standard timeline of five business days."
+)
+
+
+def completion(request: dict) -> dict:
+    from util.fake_batch_api import fake_value
+
+    tools = [t["function"]["name"] for t in request.get("tools") or []]
+    answered_tools = any(m.get("role") == "tool" for m in request["messages"])
+    message: dict = {"role": "assistant", "content": None, "refusal": None, "annotations": []}
+    if request.get("response_format"):
+        message["content"] = json.dumps(fake_value(request["response_format"]["json_schema"]["schema"]))
+    elif "get_weather" in tools and not answered_tools:
+        message["tool_calls"] = [
+            {"id": f"call_{city}", "type": "function", "function": {"name": "get_weather", "arguments": json.dumps({"city": city})}}
+            for city in ("New York", "San Francisco", "Boston")
+        ]
+    elif "request_human_approval" in tools:
+        arguments = {"date": "2024-10-01", "amount": 3000, "reason": "hospital bill for a broken leg"}
+        message["tool_calls"] = [
+            {"id": "call_approval", "type": "function", "function": {"name": "request_human_approval", "arguments": json.dumps(arguments)}}
+        ]
+    elif "AccountAgent" in tools:
+        message["tool_calls"] = [{"id": "call_route", "type": "function", "function": {"name": "AccountAgent", "arguments": "{}"}}]
+    else:
+        message["content"] = ANSWER
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request["model"],
+        "system_fingerprint": "fp_stub",
+        "service_tier": "default",
+        "choices": [{"index": 0, "finish_reason": "tool_calls" if "tool_calls" in message else "stop", "logprobs": None, "message": message}],
+        "usage": {
+            "prompt_tokens": 120,
+            "completion_tokens": 80,
+            "total_tokens": 200,
+            "prompt_tokens_details": {"cached_tokens": 0, "audio_tokens": 0},
+            "completion_tokens_details": {"reasoning_tokens": 0, "audio_tokens": 0, "accepted_prediction_tokens": 0, "rejected_prediction_tokens": 0},
+        },
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        payload = json.dumps(completion(request)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def steps() -> list[tuple[str, str, dict]]:
+    """(handler, step, llm_call arguments) of the model calls of the handlers."""
+    from chat_agent import ChatMessage
+    from human_approval_agent import InsuranceClaim
+    from multi_agent import SPECIALISTS, Question
+    from util.util import ClaimData, ClaimEvaluation, ClaimPrompt, WeatherRequest, tool
+    from workflow_orchestrator import ReportRequest, TaskList
+
+    claim = ClaimData().model_dump_json()
+    weather_tool = tool("get_weather", "Get the current weather for a location", WeatherRequest.model_json_schema())
+    weather_question = {"role": "user", "content": "What is the weather in New York,  San Francisco, and Boston?"}
+    weather_calls = {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": f"call_{city}", "type": "function", "function": {"name": "get_weather", "arguments": json.dumps({"city": city})}}
+            for city in ("New York", "San Francisco", "Boston")
+        ],
+    }
+    weather_results = [
+        {"role": "tool", "tool_call_id": f"call_{city}", "name": "get_weather", "content": "23 degrees and sunny"}
+        for city in ("New York", "San Francisco", "Boston")
+    ]
+    return [
+        ("Chat/message", "LLM call", {"messages": [{"role": "user", "content": ChatMessage().message}]}),
+        (
+            "AgentRouter/answer",
+            "Pick specialist",
+            {
+                "messages": f"You are a customer service routing system. {Question().message}",
+                "tools": [tool(name=name, description=desc) for name, desc in SPECIALISTS.items()],
+            },
+        ),
+        ("AgentRouter/answer", "Ask AccountAgent", {"messages": f"You are a login specialist. {Question().message}"}),
+        ("ParallelToolAgent/run", "LLM call (tool calls)", {"messages": [weather_question], "tools": [weather_tool]}),
+        (
+            "ParallelToolAgent/run",
+            "LLM call (answer)",
+            {"messages": [weather_question, weather_calls, *weather_results], "tools": [weather_tool]},
+        ),
+        (
+            "HumanClaimApprovalAgent/run",
+            "Evaluate claim",
+            {
+                "messages": f"You are an insurance claim evaluation agent. Claim: {ClaimPrompt().message}",
+                "tools": [tool("request_human_approval", "Ask for human approval", InsuranceClaim.model_json_schema())],
+            },
+        ),
+        ("ClaimReimbursement/process", "Parse claim document", {"messages": ClaimPrompt().message, "response_format": ClaimData}),
+        ("ClaimReimbursement/process", "Evaluate claim", {"messages": claim, "response_format": ClaimEvaluation}),
+        ("ParallelAgentClaimApproval/run", "Eligibility agent", {"messages": f"Is this claim eligible? {claim}"}),
+        ("ParallelAgentClaimApproval/run", "Decision agent", {"messages": f"Decide about claim: {claim}"}),
+        ("ResearchReport/generate", "Create research plan", {"messages": ReportRequest().topic, "response_format": TaskList}),
+        ("ResearchWorker/research", "Research", {"messages": "What is the impact of solar energy on jobs?"}),
+        ("CodeGenerator/generate", "Generate code (attempt 1)", {"messages": "Write a function that reverses a list."}),
+        ("RacingAgent/respond_quickly", "Quick response", {"messages": "Quick answer: what is durable execution?"}),
+    ]
+
+
+async def measure(repeat: int) -> list[tuple[str, str, int, float]]:
+    from restate.serde import DefaultSerde
+
+    from util.litellm_call import llm_call
+    from util.llm_result import LlmResult
+
+    # The serde that ctx.run_typed picks for the llm_call steps
+    serde: DefaultSerde[LlmResult] = DefaultSerde().with_maybe_type(typing.get_type_hints(llm_call)["return"])
+    results = []
+    for handler, step, kwargs in steps():
+        result = await llm_call(**kwargs, cache=False)
+        journaled = serde.serialize(result)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            serde.deserialize(serde.serialize(result))
+        results.append((handler, step, len(journaled), (time.perf_counter() - start) / repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=1000, help="serialization rounds per step, for the timing")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    results = asyncio.run(measure(args.repeat))
+    print(f"{'handler':<32} {'step':<26} {'bytes':>6} {'serde us':>9}")
+    for handler, step, size, seconds in results:
+        print(f"{handler:<32} {step:<26} {size:>6} {seconds * 1e6:>9.1f}")
+    total = sum(size for _, _, size, _ in results)
+    print(f"{'total':<59} {total:>6}")
+    print(f"{'mean per call':<59} {total / len(results):>6.0f} {sum(s for *_, s in results) / len(results) * 1e6:>9.1f}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+import unittest
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+import restate  # noqa: E402
+
+from util import fake_batch_api  # noqa: E402
+
+
+class QuietHandler(fake_batch_api.Handler):
+    def log_message(self, format, *args):
+        pass
+
+
+# The batch lane talks to the fake Batch API through the client of llm_call
+server = ThreadingHTTPServer(("127.0.0.1", 0), QuietHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+from util.batch_lane import BatchRequest, add, flush, poll  # noqa: E402
+from util.litellm_call import llm_client  # noqa: E402
+
+
+class FakeObjectContext:
+    """Runs the handlers of a Virtual Object in-process: state in a dict, steps without a journal."""
+
+    def __init__(self, key: str):
+        self._key = key
+        self.state: dict[str, Any] = {}
+        self.sent: list[tuple[Any, Any]] = []
+        self.resolved: dict[str, Any] = {}
+        self.rejected: dict[str, str] = {}
+
+    def key(self) -> str:
+        return self._key
+
+    async def get(self, name: str, type_hint: Any = None) -> Any:
+        return self.state.get(name)
+
+    def set(self, name: str, value: Any) -> None:
+        self.state[name] = value
+
+    def clear(self, name: str) -> None:
+        self.state.pop(name, None)
+
+    async def run_typed(self, name: str, action: Any, options: restate.RunOptions, /, **kwargs: Any) -> Any:
+        for attempt in range(options.max_attempts or 1):
+            try:
+                return await action(**kwargs)
+            except Exception as e:
+                error = e
+        raise restate.TerminalError(f"{name} failed: {error}")
+
+    def object_send(self, handler: Any, key: str, arg: Any, send_delay: Any = None) -> None:
+        self.sent.append((handler, arg))
+
+    def resolve_awakeable(self, awakeable_id: str, value: Any) -> None:
+        self.resolved[awakeable_id] = value
+
+    def reject_awakeable(self, awakeable_id: str, failure_message: str) -> None:
+        self.rejected[awakeable_id] = failure_message
+
+
+def request(awakeable_id: str) -> BatchRequest:
+    return BatchRequest(awakeable_id=awakeable_id, messages=[{"role": "user", "content": f"Question {awakeable_id}"}])
+
+
+class BatchLaneTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fake_batch_api.COMPLETION_DELAY = 0
+        fake_batch_api.fail_batches = False
+        self.ctx = FakeObjectContext("openai/gpt-5.4")
+
+    async def asyncTearDown(self):
+        await llm_client.close()
+
+    async def collect(self, *awakeable_ids: str) -> None:
+        for awakeable_id in awakeable_ids:
+            await add(self.ctx, request(awakeable_id))
+        [(handler, generation)] = self.ctx.sent
+        self.assertIs(handler, flush)
+        self.ctx.sent.clear()
+        await flush(self.ctx, generation)
+
+    async def test_answers_the_requests_of_a_batch(self):
+        await self.collect("a", "b")
+
+        [(handler, batch_id)] = self.ctx.sent
+        self.assertIs(handler, poll)
+        self.assertNotIn("pending", self.ctx.state)
+        await poll(self.ctx, batch_id)
+
+        self.assertEqual(set(self.ctx.resolved), {"a", "b"})
+        self.assertEqual(self.ctx.resolved["a"].content, "Batched answer to: Question a")
+        self.assertEqual(self.ctx.rejected, {})
+
+    async def test_rejects_the_requests_if_the_batch_cant_be_submitted(self):
+        fake_batch_api.fail_batches = True
+        await self.collect("a", "b")
+
+        # The waiting steps get an error, and call the model directly
+        self.assertEqual(set(self.ctx.rejected), {"a", "b"})
+        self.assertIn("Enqueued token limit reached", self.ctx.rejected["a"])
+        self.assertNotIn("pending", self.ctx.state)
+        self.assertEqual(self.ctx.sent, [])
+
+    async def test_stale_flush_leaves_the_next_batch(self):
+        await self.collect("a")
+        self.ctx.sent.clear()
+        await add(self.ctx, request("b"))
+        [(_, generation)] = self.ctx.sent
+        self.ctx.sent.clear()
+
+        await flush(self.ctx, generation - 1)
+        self.assertEqual(len(self.ctx.state["pending"].requests), 1)
+        self.assertEqual(self.ctx.sent, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
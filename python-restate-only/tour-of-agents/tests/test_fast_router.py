@@ -0,0 +1,58 @@
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from util.fast_router import NO_SPECIALIST, Decision, FastRouter  # noqa: E402
+
+SPECIALISTS = {
+    "BillingAgent": "Expert in payments, charges, and refunds",
+    "AccountAgent": "Expert in login issues and security",
+}
+
+DECISIONS = [
+    Decision("I was charged twice for my subscription", "BillingAgent"),
+    Decision("Please refund my last payment", "BillingAgent"),
+    Decision("I forgot my password and can't log in", "AccountAgent"),
+    Decision("Someone logged in to my account", "AccountAgent"),
+    Decision("What are your opening hours?", NO_SPECIALIST),
+]
+
+
+class FastRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.router = FastRouter.train(SPECIALISTS, DECISIONS, threshold=0.05)
+
+    def test_classifies_questions_like_the_decisions(self):
+        label, confidence = self.router.classify("I can't log in, I forgot my password")
+        self.assertEqual(label, "AccountAgent")
+        self.assertGreater(confidence, 0)
+
+    def test_routes_only_to_the_given_specialists(self):
+        question = "I was charged twice, please refund me"
+        self.assertEqual(self.router.route(question, list(SPECIALISTS)), "BillingAgent")
+        self.assertIsNone(self.router.route(question, ["AccountAgent"]))
+
+    def test_leaves_unsure_questions_to_the_model(self):
+        self.router.threshold = 1.0
+        self.assertIsNone(self.router.route("I was charged twice, please refund me", list(SPECIALISTS)))
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "router.npz"
+            self.router.save(path)
+            loaded = FastRouter.load(path, threshold=0.2)
+
+        self.assertEqual(loaded.labels, self.router.labels)
+        self.assertEqual(loaded.threshold, 0.2)
+        self.assertEqual(loaded.classify("Refund my payment"), self.router.classify("Refund my payment"))
+
+    def test_rejects_a_router_with_one_label(self):
+        with self.assertRaises(ValueError):
+            FastRouter.train({"BillingAgent": "Expert in payments"}, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
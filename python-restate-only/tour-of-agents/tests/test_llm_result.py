@@ -0,0 +1,70 @@
+import sys
+import unittest
+from pathlib import Path
+
+from litellm.types.utils import ModelResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from util.llm_result import LlmResult  # noqa: E402
+
+
+def response(message: dict) -> ModelResponse:
+    return ModelResponse(
+        choices=[{"index": 0, "finish_reason": "stop", "message": message}],
+        usage={"prompt_tokens": 12, "completion_tokens": 5, "total_tokens": 17},
+    )
+
+
+class LlmResultTest(unittest.TestCase):
+    def test_round_trip_of_a_tool_call(self):
+        result = LlmResult.from_response(
+            response(
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {"id": "call_1", "type": "function", "function": {"name": "AccountAgent", "arguments": "{}"}}
+                    ],
+                }
+            )
+        )
+
+        self.assertEqual(LlmResult.model_validate_json(result.model_dump_json()), result)
+        self.assertEqual(result.tool_calls[0].function.name, "AccountAgent")
+        self.assertEqual((result.usage.prompt_tokens, result.usage.completion_tokens), (12, 5))
+
+    def test_leaves_out_empty_fields(self):
+        result = LlmResult.from_response(response({"role": "assistant", "content": "Hello"}))
+
+        self.assertEqual(result.tool_calls, None)
+        self.assertNotIn("tool_calls", result.model_dump_json())
+        self.assertEqual(LlmResult.model_validate_json(result.model_dump_json()), result)
+
+    def test_to_message_continues_the_conversation(self):
+        result = LlmResult.from_response(
+            response(
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {"id": "call_1", "type": "function", "function": {"name": "get_weather", "arguments": '{"city": "Boston"}'}}
+                    ],
+                }
+            )
+        )
+
+        self.assertEqual(
+            result.to_message(),
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": "call_1", "type": "function", "function": {"name": "get_weather", "arguments": '{"city": "Boston"}'}}
+                ],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from pydantic import BaseModel  # noqa: E402
+
+from util.rate_limiter import Lease, LeaseRequest, RateLimiterClient, Release  # noqa: E402
+
+
+class FakeRateLimiterClient(RateLimiterClient):
+    """Takes its leases from a list of answers instead of the RateLimiter object."""
+
+    def __init__(self, leases: list[Lease], **kwargs):
+        super().__init__("http://localhost:8080", **kwargs)
+        self.answers = leases
+        self.released: list[Release] = []
+
+    async def _post(self, key: str, handler: str, request: BaseModel) -> httpx.Response:
+        if handler == "release":
+            assert isinstance(request, Release)
+            self.released.append(request)
+            return httpx.Response(200, content=b"null")
+        assert isinstance(request, LeaseRequest)
+        return httpx.Response(200, content=self.answers.pop(0).model_dump_json())
+
+
+class RateLimiterClientTest(unittest.IsolatedAsyncioTestCase):
+    async def test_settle_returns_unused_tokens(self):
+        client = FakeRateLimiterClient([Lease(requests=2, tokens=2000)])
+        taken = await client.acquire("openai/gpt-5.4", 1000)
+        client.settle("openai/gpt-5.4", taken, 400)
+
+        # The second call fits in what the first one didn't use
+        await client.acquire("openai/gpt-5.4", 1600)
+        self.assertEqual(client.stats.leases, 1)
+
+    async def test_settle_takes_overuse_from_the_next_calls(self):
+        client = FakeRateLimiterClient([Lease(requests=2, tokens=2000), Lease(requests=2, tokens=2000)])
+        taken = await client.acquire("openai/gpt-5.4", 1000)
+        client.settle("openai/gpt-5.4", taken, 1500)
+
+        await client.acquire("openai/gpt-5.4", 1000)
+        self.assertEqual(client.stats.leases, 2)
+
+    async def test_settle_of_an_unknown_key_is_ignored(self):
+        client = FakeRateLimiterClient([])
+        client.settle("openai/gpt-5.4", 1000, 400)
+        self.assertEqual(client.stats.leases, 0)
+
+    async def test_waiting_call_doesnt_hold_back_the_others(self):
+        client = FakeRateLimiterClient(
+            [Lease(requests=1, tokens=1000), Lease(retry_after=0.2), Lease(requests=1, tokens=1000)]
+        )
+        await client.acquire("openai/gpt-5.4", 1000)
+        waiting = asyncio.create_task(client.acquire("openai/gpt-5.4", 1000))
+        await asyncio.sleep(0.05)
+
+        # Capacity that was given back while the first call waits
+        local = client._leases["openai/gpt-5.4"]
+        local.requests, local.tokens = 1, 1000
+        await asyncio.wait_for(client.acquire("openai/gpt-5.4", 1000), timeout=0.1)
+        self.assertFalse(waiting.done())
+
+        await waiting
+        self.assertEqual(client.stats.waits, 1)
+
+    async def test_gives_back_unused_capacity_when_the_lease_expires(self):
+        client = FakeRateLimiterClient([Lease(requests=10, tokens=10_000)], lease_ttl=0.05)
+        taken = await client.acquire("openai/gpt-5.4", 1000)
+        client.settle("openai/gpt-5.4", taken, 500)
+        await asyncio.sleep(0.1)
+
+        self.assertEqual(client.released, [Release(requests=9, tokens=9500)])
+        self.assertEqual(client._leases["openai/gpt-5.4"].requests, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from util.llm_result import LlmResult  # noqa: E402
+from util.route_batcher import Route, RouteBatcher, Routes, specialist_message  # noqa: E402
+from util.scheduler import BACKGROUND  # noqa: E402
+
+TOOLS = [
+    {"type": "function", "function": {"name": "BillingAgent", "description": "Expert in payments"}},
+    {"type": "function", "function": {"name": "AccountAgent", "description": "Expert in login issues"}},
+]
+
+
+class FakeModel:
+    """Answers batch calls with the given routes, and single routing calls with AccountAgent."""
+
+    def __init__(self, routes: list[Route]):
+        self.routes = routes
+        self.calls: list[dict[str, Any]] = []
+
+    async def __call__(self, messages: str, **kwargs: Any) -> LlmResult:
+        self.calls.append({"messages": messages, **kwargs})
+        if kwargs.get("response_format") is Routes:
+            return LlmResult(content=Routes(routes=self.routes).model_dump_json())
+        return specialist_message("AccountAgent", "single")
+
+
+class RouteBatcherTest(unittest.IsolatedAsyncioTestCase):
+    async def route_all(self, batcher: RouteBatcher, *questions: str) -> list[LlmResult]:
+        return await asyncio.gather(
+            *(batcher.route(q, TOOLS, "Pick specialist", BACKGROUND, f"tenant-{i}") for i, q in enumerate(questions))
+        )
+
+    async def test_routes_a_batch_in_one_call(self):
+        model = FakeModel([Route(id=0, specialist="BillingAgent", answer=None), Route(id=1, specialist=None, answer="Hi!")])
+        batcher = RouteBatcher(model, window=0.01)
+        billing, direct = await self.route_all(batcher, "Refund me", "Hello")
+
+        self.assertEqual(billing.tool_calls[0].function.name, "BillingAgent")
+        self.assertEqual(direct.content, "Hi!")
+        self.assertEqual(len(model.calls), 1)
+        self.assertEqual((model.calls[0]["lane"], model.calls[0]["tenant"]), (BACKGROUND, "tenant-0"))
+
+    async def test_falls_back_to_a_call_per_request_without_a_valid_route(self):
+        # No route for request 1, and an unknown specialist for request 2
+        model = FakeModel([Route(id=0, specialist="BillingAgent", answer=None), Route(id=2, specialist="Sales", answer=None)])
+        batcher = RouteBatcher(model, window=0.01)
+        results = await self.route_all(batcher, "Refund me", "I can't log in", "Buy more")
+
+        self.assertEqual([r.tool_calls[0].function.name for r in results], ["BillingAgent", "AccountAgent", "AccountAgent"])
+        self.assertEqual(batcher.stats.fallbacks, 2)
+        fallbacks = model.calls[1:]
+        self.assertEqual(sorted(call["messages"] for call in fallbacks), ["Buy more", "I can't log in"])
+        for call in fallbacks:
+            self.assertEqual(call["tools"], TOOLS)
+            self.assertEqual(call["lane"], BACKGROUND)
+        self.assertEqual(sorted(call["tenant"] for call in fallbacks), ["tenant-1", "tenant-2"])
+
+    async def test_a_failed_batch_call_fails_its_requests(self):
+        async def failing_model(messages: str, **kwargs: Any) -> LlmResult:
+            raise RuntimeError("Model unavailable")
+
+        batcher = RouteBatcher(failing_model, window=0.01)
+        with self.assertRaisesRegex(RuntimeError, "Model unavailable"):
+            await self.route_all(batcher, "Refund me", "Hello")
+
+    async def test_full_batch_doesnt_wait_for_the_window(self):
+        model = FakeModel([Route(id=i, specialist="BillingAgent", answer=None) for i in range(2)])
+        batcher = RouteBatcher(model, window=10, max_size=2)
+        await asyncio.wait_for(self.route_all(batcher, "Refund me", "Charged twice"), timeout=1)
+        self.assertEqual(batcher.stats.batches, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from util.scheduler import BACKGROUND, INTERACTIVE, FairScheduler  # noqa: E402
+
+
+class FairSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def grant_order(self, scheduler: FairScheduler, calls: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """The order in which the queued calls get the slot, with one slot that is taken at the start."""
+        order: list[tuple[str, str]] = []
+
+        async def call(lane: str, tenant: str) -> None:
+            async with scheduler.slot(lane, tenant):
+                order.append((lane, tenant))
+
+        async with scheduler.slot():
+            tasks = [asyncio.create_task(call(lane, tenant)) for lane, tenant in calls]
+            # let all calls queue up
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return order
+
+    async def test_lanes_share_slots_by_weight(self):
+        scheduler = FairScheduler(1, lane_weights={INTERACTIVE: 8, BACKGROUND: 1})
+        calls = [(BACKGROUND, "default")] * 40 + [(INTERACTIVE, "default")] * 20
+        order = await self.grant_order(scheduler, calls)
+
+        lanes = [lane for lane, _ in order[:18]]
+        self.assertEqual(lanes.count(INTERACTIVE), 16)
+        self.assertEqual(lanes.count(BACKGROUND), 2)
+        self.assertEqual(len(order), len(calls))
+
+    async def test_tenants_share_their_lane_by_weight(self):
+        scheduler = FairScheduler(1, tenant_weights={"a": 3, "b": 1})
+        calls = [(BACKGROUND, "b")] * 20 + [(BACKGROUND, "a")] * 20
+        order = await self.grant_order(scheduler, calls)
+
+        tenants = [tenant for _, tenant in order[:16]]
+        self.assertEqual(tenants.count("a"), 12)
+        self.assertEqual(tenants.count("b"), 4)
+
+    async def test_lane_weights_hold_with_many_tenants(self):
+        # The position of a lane doesn't depend on the turns of its tenants
+        scheduler = FairScheduler(1, lane_weights={INTERACTIVE: 8, BACKGROUND: 1})
+        calls = [(BACKGROUND, "fan-out")] * 40 + [(INTERACTIVE, f"session-{i % 5}") for i in range(20)]
+        order = await self.grant_order(scheduler, calls)
+
+        lanes = [lane for lane, _ in order[:18]]
+        self.assertEqual(lanes.count(INTERACTIVE), 16)
+
+
+if __name__ == "__main__":
+    unittest.main()